@@ -1,11 +1,23 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from speechbrain.inference.classifiers import EncoderClassifier
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
-import os
 import subprocess
 import logging
 import requests
+import os
+import threading
+import time
+import multiprocessing
+import numpy as np
+import torch
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from flask_cors import CORS
+from audio import SAMPLE_RATE, decode_audio, encode_wav, fingerprint, signatures_match, split_on_silence, trim_silence
+from http_client import ServiceBusy, TranscriptionClient
+from jobs import JobQueue, QueueFull
+from metrics import StageMetrics, StageTimer
+from result_cache import ResultCache, content_key
 
 
 # Set up logging
@@ -15,24 +27,170 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 # Update allowed extensions to include webm
-UPLOAD_FOLDER = 'uploads'
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'm4a', 'flac', 'ogg', 'webm'}
+# Uploads are read into memory and queued jobs keep theirs until they run, so
+# bound the request body; larger uploads get a 413 (0 = no limit)
+app.config['MAX_CONTENT_LENGTH'] = int(float(os.getenv('MAX_UPLOAD_MB', '100')) * 1024 * 1024) or None
+
+# Batch language identification settings
+LANGID_BATCH_SIZE = int(os.getenv('LANGID_BATCH_SIZE', '16'))
+# Directory/manifest jobs read server-side files, so they are confined to this root
+LANGID_BATCH_ROOT = os.getenv('LANGID_BATCH_ROOT')
+
+# 'full' classifies the whole recording; 'progressive' classifies growing
+# windows and stops once the posterior reaches LANGID_CONFIDENCE
+LANGID_MODE = os.getenv('LANGID_MODE', 'full')
+LANGID_WINDOWS = [float(w) for w in os.getenv('LANGID_WINDOWS', '3,6,12').split(',')]
+LANGID_CONFIDENCE = float(os.getenv('LANGID_CONFIDENCE', '0.9'))
+
+# Results cache keyed by upload content hash, and optionally by a decoded-PCM
+# spectral fingerprint so the same clip re-encoded to another format still hits
+result_cache = None
+if os.getenv('RESULT_CACHE_ENABLED', '1') == '1':
+    result_cache = ResultCache(
+        os.path.join(os.getenv('RESULT_CACHE_DIR', 'cache'), 'results.sqlite3'),
+        max_memory_items=int(os.getenv('RESULT_CACHE_MEMORY_ITEMS', '1024')),
+        max_disk_items=int(os.getenv('RESULT_CACHE_DISK_ITEMS', '100000')),
+        ttl_seconds=float(os.getenv('RESULT_CACHE_TTL_SECONDS', str(7 * 86400))),
+    )
+# Off by default: a fingerprint hit serves another upload's transcription, so
+# it is only used after the stored signature is verified against this clip
+RESULT_CACHE_PCM_FINGERPRINT = os.getenv('RESULT_CACHE_PCM_FINGERPRINT', '0') == '1'
+
+# Recordings longer than SEGMENT_LONG_AUDIO_SECONDS (0 disables) are split at
+# pauses into chunks of at most SEGMENT_MAX_SECONDS; chunks are language-identified
+# on SEGMENT_PROCESSES worker processes (0 = in this process) and transcribed
+# concurrently, so code-switched recordings get a language per segment
+SEGMENT_LONG_AUDIO_SECONDS = float(os.getenv('SEGMENT_LONG_AUDIO_SECONDS', '60'))
+SEGMENT_MAX_SECONDS = float(os.getenv('SEGMENT_MAX_SECONDS', '30'))
+SEGMENT_MIN_SECONDS = float(os.getenv('SEGMENT_MIN_SECONDS', '5'))
+SEGMENT_PROCESSES = int(os.getenv('SEGMENT_PROCESSES', '2'))
+# Chunks of one recording uploaded at once; keep this a small share of
+# TRANSCRIBE_CONCURRENCY so one long recording cannot take every slot
+SEGMENT_UPLOAD_CONCURRENCY = int(os.getenv('SEGMENT_UPLOAD_CONCURRENCY', '2'))
+
+# Remote transcription service, reached through a keep-alive connection pool.
+# At most TRANSCRIBE_CONCURRENCY calls are in flight per process, of which
+# background jobs may hold TRANSCRIBE_BACKGROUND_CONCURRENCY (default half);
+# synchronous requests wait up to TRANSCRIBE_QUEUE_TIMEOUT for a slot and get
+# a 503 after that, background jobs wait as long as needed
+transcription_client = TranscriptionClient(
+    os.getenv('TRANSCRIPTION_URL', 'https://fb5c-34-105-97-21.ngrok-free.app/transcribe/'),
+    pool_size=int(os.getenv('TRANSCRIPTION_POOL_SIZE', '8')),
+    max_concurrency=int(os.getenv('TRANSCRIBE_CONCURRENCY', '4')),
+    connect_timeout=float(os.getenv('TRANSCRIPTION_CONNECT_TIMEOUT', '10')),
+    read_timeout=float(os.getenv('TRANSCRIPTION_READ_TIMEOUT', '300')),
+    retries=int(os.getenv('TRANSCRIPTION_CONNECT_RETRIES', '2')),
+    max_background=int(os.getenv('TRANSCRIBE_BACKGROUND_CONCURRENCY', '0')) or None,
+)
+TRANSCRIBE_QUEUE_TIMEOUT = float(os.getenv('TRANSCRIBE_QUEUE_TIMEOUT', '30'))
 
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
+# Per-stage latency histograms, served on /metrics
+stage_metrics = StageMetrics()
 
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+# Background /transcribe/jobs queue
+job_queue = JobQueue(
+    os.path.join(os.getenv('JOB_DIR', 'cache'), 'jobs.sqlite3'),
+    workers=int(os.getenv('JOB_WORKERS', '2')),
+    max_pending=int(os.getenv('JOB_MAX_PENDING', '100')),
+    retention_seconds=float(os.getenv('JOB_RETENTION_SECONDS', '3600')),
+    # Comma-separated host names callbacks may go to; empty = any public host
+    callback_hosts=[h.strip().lower() for h in os.getenv('JOB_CALLBACK_HOSTS', '').split(',') if h.strip()],
+)
+
+# Inference settings: torch intra-op threads per worker (0 = torch default) and
+# the size of the pool that runs classification off the request threads
+TORCH_NUM_THREADS = int(os.getenv('TORCH_NUM_THREADS', '0'))
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '1'))
+
+# torch's thread count before preloading forces it to 1, restored in workers
+default_num_threads = torch.get_num_threads()
 
 # Initialize the language identification model
 language_id = None
+model_lock = threading.Lock()
+inference_executor = None
+inference_executor_pid = None
+inference_executor_lock = threading.Lock()
+segment_pool = None
+segment_pool_pid = None
+segment_pool_lock = threading.Lock()
 
 def load_model():
     global language_id
     if language_id is None:
-        language_id = EncoderClassifier.from_hparams(
-            source="speechbrain/lang-id-voxlingua107-ecapa",
-            savedir="tmp"
-        )
+        with model_lock:
+            if language_id is None:
+                language_id = EncoderClassifier.from_hparams(
+                    source="speechbrain/lang-id-voxlingua107-ecapa",
+                    savedir="tmp"
+                )
+
+def warm_model():
+    """Load the model and run one dummy classification so first requests are fast"""
+    load_model()
+    with torch.inference_mode():
+        language_id.classify_batch(torch.zeros(1, SAMPLE_RATE))
+
+def configure_threads():
+    """Apply TORCH_NUM_THREADS, or torch's own default when it is 0; call in each worker after fork"""
+    torch.set_num_threads(TORCH_NUM_THREADS or default_num_threads)
+
+def run_inference(fn, *args, **kwargs):
+    """Run CPU-heavy classification on the bounded inference pool and wait for it"""
+    global inference_executor, inference_executor_pid
+    # Pool threads do not survive fork(), so each worker process builds its own,
+    # once: racing first requests would otherwise each create a pool
+    if inference_executor_pid != os.getpid():
+        with inference_executor_lock:
+            if inference_executor_pid != os.getpid():
+                inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix='langid')
+                inference_executor_pid = os.getpid()
+
+    def call():
+        with torch.inference_mode():
+            return fn(*args, **kwargs)
+
+    return inference_executor.submit(call).result()
+
+def init_segment_worker():
+    configure_threads()
+    warm_model()
+
+def classify_segments(signals):
+    """Segment pool entry point: classify one share of the chunks"""
+    with torch.inference_mode():
+        return classify_signals(signals)
+
+def identify_segments(signals):
+    """Language-ID every chunk, spread across the segment process pool"""
+    global segment_pool, segment_pool_pid
+    if SEGMENT_PROCESSES <= 0 or len(signals) == 1:
+        return run_inference(classify_signals, signals)
+    if segment_pool_pid != os.getpid():
+        # Concurrent jobs must share one pool; a second one would load its own models
+        with segment_pool_lock:
+            if segment_pool_pid != os.getpid():
+                # spawn, not fork: the server process is multi-threaded and may hold
+                # an OpenMP pool. Each worker loads the model once and is reused.
+                segment_pool = ProcessPoolExecutor(max_workers=SEGMENT_PROCESSES,
+                                                   mp_context=multiprocessing.get_context('spawn'),
+                                                   initializer=init_segment_worker)
+                segment_pool_pid = os.getpid()
+    shares = np.array_split(np.arange(len(signals)), min(SEGMENT_PROCESSES, len(signals)))
+    futures = [segment_pool.submit(classify_segments, [signals[i] for i in share]) for share in shares]
+    return [result for future in futures for result in future.result()]
+
+if os.getenv('LANGID_PRELOAD', '0') == '1':
+    # Load and warm in the parent before a pre-forking server (see
+    # gunicorn.conf.py) forks, so workers share the weights copy-on-write.
+    # Stay single-threaded here: an OpenMP pool started before fork can hang
+    # the children; workers get TORCH_NUM_THREADS (or the default captured
+    # above) back in post_fork, segment workers in init_segment_worker.
+    torch.set_num_threads(1)
+    warm_model()
+else:
+    configure_threads()
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -41,33 +199,78 @@ def extract_language_name(lang_code_and_name):
     """Extract just the language name from the format 'code: Name'"""
     return lang_code_and_name.split(': ')[1] if ': ' in lang_code_and_name else lang_code_and_name
 
-def convert_to_mp3(input_path):
-    """Convert any audio format to mp3 using ffmpeg"""
-    output_path = input_path.rsplit('.', 1)[0] + '.mp3'
+def detect_language(signal):
+    """Detect language from a 16 kHz mono waveform (numpy float32)"""
     try:
-        # Run ffmpeg command to convert to mp3
-        cmd = ['ffmpeg', '-i', input_path, '-acodec', 'libmp3lame', '-ab', '192k', output_path, '-y']
-        subprocess.run(cmd, check=True, capture_output=True)
-        logger.info(f"Converted {input_path} to {output_path}")
-        return output_path
-    except subprocess.CalledProcessError as e:
-        logger.error(f"FFmpeg conversion failed: {e.stderr.decode()}")
-        raise Exception(f"Failed to convert audio: {e}")
-    except Exception as e:
-        logger.error(f"Conversion error: {str(e)}")
-        raise
-
-def detect_language(audio_path):
-    """Detect language from audio file"""
-    try:
-        signal = language_id.load_audio(audio_path)
-        prediction = language_id.classify_batch(signal)
+        prediction = language_id.classify_batch(torch.from_numpy(signal).unsqueeze(0))
         detected_language = extract_language_name(prediction[3][0])
         return detected_language
     except Exception as e:
         logger.error(f"Language detection error: {str(e)}")
         raise
 
+def detect_language_progressive(signal, windows=LANGID_WINDOWS, threshold=LANGID_CONFIDENCE):
+    """Classify growing windows of the trimmed signal until the posterior reaches threshold.
+
+    Returns (language, score, seconds of audio used). Compute is bounded by the
+    largest window however long the recording is.
+    """
+    # An all-silent clip trims to nothing; classify it untrimmed instead
+    trimmed = trim_silence(signal)
+    if trimmed.size:
+        signal = trimmed
+    for seconds in windows:
+        window = signal[:int(seconds * SAMPLE_RATE)]
+        prediction = language_id.classify_batch(torch.from_numpy(window).unsqueeze(0))
+        score = float(prediction[1][0].exp())
+        if score >= threshold or len(window) == len(signal):
+            break
+    logger.info(f"Progressive language ID stopped at {len(window) / SAMPLE_RATE:.1f}s (score {score:.3f})")
+    return extract_language_name(prediction[3][0]), score, len(window) / SAMPLE_RATE
+
+def classify_signals(signals, batch_size=LANGID_BATCH_SIZE):
+    """Classify many waveforms with length-sorted, zero-padded classify_batch calls"""
+    # Sorting by length keeps clips of similar duration together, so little
+    # compute is spent on padding
+    order = sorted(range(len(signals)), key=lambda i: len(signals[i]))
+    results = [None] * len(signals)
+    for start in range(0, len(order), batch_size):
+        group = order[start:start + batch_size]
+        max_len = max(len(signals[i]) for i in group)
+        wavs = torch.zeros(len(group), max_len)
+        for row, i in enumerate(group):
+            wavs[row, :len(signals[i])] = torch.from_numpy(signals[i])
+        wav_lens = torch.tensor([len(signals[i]) / max_len for i in group])
+        prediction = language_id.classify_batch(wavs, wav_lens)
+        for row, i in enumerate(group):
+            language = extract_language_name(prediction[3][row])
+            results[i] = {
+                'detected_language': language,
+                'language_code': get_language_code(language),
+                'score': float(prediction[1][row].exp()),
+            }
+    return results
+
+def resolve_batch_paths(job):
+    """Expand a {'directory': ...} or {'manifest': ...} job into audio paths under LANGID_BATCH_ROOT"""
+    if not LANGID_BATCH_ROOT:
+        raise ValueError('Directory and manifest jobs are disabled; set LANGID_BATCH_ROOT')
+    root = os.path.realpath(LANGID_BATCH_ROOT)
+
+    def inside_root(path):
+        path = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f'{path} is outside LANGID_BATCH_ROOT')
+        return path
+
+    if 'directory' in job:
+        directory = inside_root(job['directory'])
+        return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if allowed_file(name)]
+    if 'manifest' in job:
+        with open(inside_root(job['manifest'])) as f:
+            return [inside_root(line.strip()) for line in f if line.strip()]
+    raise ValueError("Provide uploaded 'files', or a JSON 'directory' or 'manifest'")
+
 def get_language_code(language_name):
     """Convert language name to code for transcription"""
     # Your existing language mappings dictionary here
@@ -121,76 +324,340 @@ def get_language_code(language_name):
     }
     return language_mappings.get(language_name, 'en')
 
-@app.route('/transcribe', methods=['POST'])
-def transcribe():
-    if 'file' not in request.files:
+class DeferToJob(Exception):
+    pass
+
+def post_transcription(filename, audio, mimetype, language_code, wait=None, background=False):
+    """Stream the upload (bytes or a path) to the transcription service over the pooled client"""
+    # Forward the original upload bytes; no re-encode needed
+    return transcription_client.transcribe(filename, audio, mimetype, {'language': language_code},
+                                           wait=wait, background=background)
+
+def transcribe_segments(stage, filename, signal, ranges, wait=None, background=False):
+    """Language-ID and transcribe each (start, end) chunk of signal, then stitch the results.
+
+    Returns (response_data, ok). At most SEGMENT_UPLOAD_CONCURRENCY chunks are
+    uploaded at once, and wait bounds the whole request, not each chunk.
+    Upstream segment timestamps are shifted by the chunk offset; the overall
+    language is the one covering the most audio.
+    """
+    stage('language_id')
+    chunks = [signal[start:end] for start, end in ranges]
+    languages = identify_segments(chunks)
+
+    stage('transcribing')
+    stem = filename.rsplit('.', 1)[0]
+    deadline = None if wait is None else time.monotonic() + wait
+
+    def upload(i):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return post_transcription(f'{stem}-{i:03d}.wav', encode_wav(chunks[i]), 'audio/wav',
+                                  languages[i]['language_code'], wait=remaining, background=background)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), SEGMENT_UPLOAD_CONCURRENCY))) as pool:
+        responses = list(pool.map(upload, range(len(chunks))))
+
+    segments, texts, seconds_by_language = [], [], {}
+    for (start, end), language, response in zip(ranges, languages, responses):
+        offset = start / SAMPLE_RATE
+        part = response.json()
+        segment = dict(language, start=round(offset, 3), end=round(end / SAMPLE_RATE, 3), text=part.get('text', ''))
+        if isinstance(part.get('segments'), list):
+            segment['segments'] = [dict(s, start=s['start'] + offset, end=s['end'] + offset)
+                                   if isinstance(s, dict) and 'start' in s and 'end' in s else s
+                                   for s in part['segments']]
+        if not response.ok:
+            segment['error'] = part.get('error', f'Transcription service returned {response.status_code}')
+        segments.append(segment)
+        if segment['text']:
+            texts.append(segment['text'])
+        name = language['detected_language']
+        seconds_by_language[name] = seconds_by_language.get(name, 0.0) + (end - start) / SAMPLE_RATE
+
+    detected_language = max(seconds_by_language, key=seconds_by_language.get)
+    logger.info(f"Segmented {len(segments)} chunks, languages: "
+                f"{', '.join(f'{k} {v:.0f}s' for k, v in seconds_by_language.items())}")
+    return {
+        'text': ' '.join(texts),
+        'segments': segments,
+        'detected_language': detected_language,
+        'language_code': get_language_code(detected_language),
+        'languages': sorted({segment['language_code'] for segment in segments}),
+    }, all(response.ok for response in responses)
+
+def segment_key(key, segment):
+    """Cache key for a forced segment on/off request; segmented and whole-file results differ in shape"""
+    return f'{key}:segment={int(segment)}' if key and segment is not None else key
+
+def request_segment():
+    """The 'segment' form field: None (automatic), True or False"""
+    value = request.form.get('segment')
+    return None if value in (None, '', 'auto') else value.lower() in ('1', 'true', 'yes')
+
+def request_defer():
+    """The 'defer' form field: whether /transcribe may answer a segmented upload with a 202 job"""
+    return request.form.get('defer', '').lower() in ('1', 'true', 'yes')
+
+def cache_result(cache_key, pcm_key, signature, response_data):
+    """Cache a transcription under its content key and, with its signature, under its fingerprint"""
+    if not result_cache:
+        return
+    if cache_key:
+        result_cache.set(cache_key, response_data)
+    if pcm_key:
+        result_cache.set(pcm_key, {'result': response_data, 'signature': signature})
+
+def run_transcription(stage, filename, audio_bytes, mimetype, langid_mode, cache_key, wait=None, segment=None,
+                      background=False, defer_segmented=False):
+    """Decode, identify the language and transcribe one upload, reporting progress through stage(name).
+
+    segment=None splits recordings longer than SEGMENT_LONG_AUDIO_SECONDS;
+    True or False forces it on or off. With defer_segmented, a recording that
+    would be split raises DeferToJob instead, so the caller can queue it.
+    background marks job traffic for the transcription client's slot share.
+    """
+    stage('decoding')
+    # Decode once, straight to 16 kHz mono
+    signal = decode_audio(audio_bytes, suffix='.' + filename.rsplit('.', 1)[1].lower())
+    stage('fingerprint')
+    pcm_key, signature = fingerprint(signal) if result_cache and RESULT_CACHE_PCM_FINGERPRINT else (None, None)
+    pcm_key = segment_key(pcm_key, segment)
+    candidate = result_cache.get(pcm_key) if pcm_key else None
+    # Only trust a fingerprint hit whose stored signature matches this clip
+    if candidate is not None and signatures_match(candidate.get('signature'), signature):
+        result_cache.set(cache_key, candidate['result'])
+        return candidate['result']
+
+    if segment is None:
+        segment = bool(SEGMENT_LONG_AUDIO_SECONDS) and len(signal) > SEGMENT_LONG_AUDIO_SECONDS * SAMPLE_RATE
+    if segment and defer_segmented:
+        raise DeferToJob()
+    if segment:
+        ranges = split_on_silence(signal, max_seconds=SEGMENT_MAX_SECONDS, min_seconds=SEGMENT_MIN_SECONDS)
+        load_model()
+        response_data, ok = transcribe_segments(stage, filename, signal, ranges, wait=wait, background=background)
+        if ok:
+            cache_result(cache_key, pcm_key, signature, response_data)
+        return response_data
+
+    # Load model and detect language
+    stage('language_id')
+    load_model()
+    if langid_mode == 'progressive':
+        detected_language, _, _ = run_inference(detect_language_progressive, signal)
+    else:
+        detected_language = run_inference(detect_language, signal)
+    language_code = get_language_code(detected_language)
+
+    logger.info(f"Detected language: {detected_language} (code: {language_code})")
+
+    # Make request to the transcription service
+    stage('transcribing')
+    response = post_transcription(filename, audio_bytes, mimetype, language_code, wait=wait, background=background)
+
+    # Add language detection info to response
+    response_data = response.json()
+    response_data['detected_language'] = detected_language
+    response_data['language_code'] = language_code
+
+    # Only successful transcriptions are worth replaying
+    if response.ok:
+        cache_result(cache_key, pcm_key, signature, response_data)
+    return response_data
+
+def upload_too_large():
+    return jsonify({'error': f"Upload exceeds {app.config['MAX_CONTENT_LENGTH']} bytes"}), 413
+
+def read_upload():
+    """Validate the 'file' upload; returns (filename, bytes, mimetype) or an error response"""
+    try:
+        files = request.files
+    except RequestEntityTooLarge:
+        return upload_too_large()
+    if 'file' not in files:
         return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
+
+    file = files['file']
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
-    
+
     if not allowed_file(file.filename):
         return jsonify({'error': 'Invalid file type'}), 400
 
-    original_file = None
-    converted_file = None
-    
-    try:
-        # Save the uploaded file
-        filename = secure_filename(file.filename)
-        original_file = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(original_file)
-        
-        # Convert to mp3 if needed
-        if not filename.lower().endswith('.mp3'):
-            logger.info(f"Converting {filename} to MP3")
-            converted_file = convert_to_mp3(original_file)
-            processing_path = converted_file
-        else:
-            processing_path = original_file
+    # Keep the upload in memory
+    return secure_filename(file.filename), file.read(), file.mimetype
 
-        # Load model and detect language
-        load_model()
-        detected_language = detect_language(processing_path)
-        language_code = get_language_code(detected_language)
-        
-        logger.info(f"Detected language: {detected_language} (code: {language_code})")
+@app.route('/transcribe', methods=['POST'])
+def transcribe():
+    timer = StageTimer(stage_metrics, 'transcribe')
+    outcome = 'error'
+    try:
+        timer('read_upload')
+        upload = read_upload()
+        if not isinstance(upload[0], str):
+            outcome = 'rejected'
+            return upload
 
-        # Make request to the transcription service
-        transcription_url = "https://fb5c-34-105-97-21.ngrok-free.app/transcribe/"
-        
-        with open(processing_path, 'rb') as audio_file:
-            files = {
-                'file': audio_file
-            }
-            data = {
-                'language': language_code
-            }
-            response = requests.post(transcription_url, files=files, data=data)
+        timer('cache_lookup')
+        filename, audio_bytes, mimetype = upload
+        segment = request_segment()
+        cache_key = segment_key(content_key(audio_bytes), segment) if result_cache else None
+        cached = result_cache.get(cache_key) if result_cache else None
+        if cached is not None:
+            outcome = 'cache_hit'
+            return jsonify(cached)
 
-        # Add language detection info to response
-        response_data = response.json()
-        response_data['detected_language'] = detected_language
-        response_data['language_code'] = language_code
-        
-        return jsonify(response_data)
+        langid_mode = request.form.get('langid_mode', LANGID_MODE)
+        try:
+            # Segmented uploads are transcribed here within the usual deadline
+            # (503 when the service is busy); callers that can poll opt in with
+            # defer=true to get a 202 job for them instead
+            result = run_transcription(timer, filename, audio_bytes, mimetype, langid_mode, cache_key,
+                                       wait=TRANSCRIBE_QUEUE_TIMEOUT, segment=segment,
+                                       defer_segmented=request_defer())
+        except DeferToJob:
+            outcome = 'deferred'
+            return enqueue_transcription(filename, audio_bytes, mimetype, langid_mode, cache_key, segment)
+        outcome = 'ok'
+        return jsonify(result)
 
+    except ServiceBusy as e:
+        outcome = 'busy'
+        return jsonify({'error': str(e)}), 503
+    except requests.Timeout as e:
+        outcome = 'timeout'
+        logger.error(f"Transcription service timed out: {str(e)}")
+        return jsonify({'error': 'Transcription service timed out'}), 504
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
         return jsonify({'error': str(e)}), 500
-        
     finally:
-        # Clean up files
+        timer.finish(outcome=outcome)
+
+def run_transcription_job(stage, *args):
+    """run_transcription for the job queue: report stages to the job and to stage_metrics"""
+    timer = StageTimer(stage_metrics, 'transcribe_job')
+
+    def both(name):
+        timer(name)
+        stage(name)
+
+    outcome = 'error'
+    try:
+        result = run_transcription(both, *args, background=True)
+        outcome = 'ok'
+        return result
+    finally:
+        timer.finish(outcome=outcome)
+
+@app.route('/transcribe/jobs', methods=['POST'])
+def submit_transcription_job():
+    """Queue a transcription and return 202 with a job id to poll; cache hits return 200 immediately"""
+    upload = read_upload()
+    if not isinstance(upload[0], str):
+        return upload
+
+    callback_url = request.form.get('callback_url')
+    if callback_url:
         try:
-            if original_file and os.path.exists(original_file):
-                os.remove(original_file)
-            if converted_file and os.path.exists(converted_file):
-                os.remove(converted_file)
-        except Exception as cleanup_error:
-            logger.error(f"Error during cleanup: {cleanup_error}")
+            job_queue.check_callback(callback_url)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    filename, audio_bytes, mimetype = upload
+    segment = request_segment()
+    cache_key = segment_key(content_key(audio_bytes), segment) if result_cache else None
+    cached = result_cache.get(cache_key) if result_cache else None
+    if cached is not None:
+        return jsonify({'status': 'done', 'result': cached})
+
+    return enqueue_transcription(filename, audio_bytes, mimetype, request.form.get('langid_mode', LANGID_MODE),
+                                 cache_key, segment, callback_url=callback_url)
+
+def enqueue_transcription(filename, audio_bytes, mimetype, langid_mode, cache_key, segment, callback_url=None):
+    """Queue a background transcription and build the 202 (or 503 when the queue is full) response"""
+    try:
+        job_id = job_queue.submit(run_transcription_job, filename, audio_bytes, mimetype, langid_mode, cache_key,
+                                  None, segment, callback_url=callback_url)
+    except QueueFull as e:
+        return jsonify({'error': f'Job queue is full: {str(e)}'}), 503
+
+    status_url = f'/transcribe/jobs/{job_id}'
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': status_url}), 202, {'Location': status_url}
+
+@app.route('/transcribe/jobs/<job_id>', methods=['GET'])
+def get_transcription_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job)
+
+@app.route('/detect_language_batch', methods=['POST'])
+def detect_language_batch():
+    timer = StageTimer(stage_metrics, 'detect_language_batch')
+    try:
+        timer('read_upload')
+        uploads = request.files.getlist('files')
+        if uploads:
+            clips = []
+            for upload in uploads:
+                if not allowed_file(upload.filename):
+                    return jsonify({'error': f'Invalid file type: {upload.filename}'}), 400
+                clips.append((secure_filename(upload.filename), upload.read()))
+        else:
+            clips = []
+            for path in resolve_batch_paths(request.get_json(silent=True) or {}):
+                with open(path, 'rb') as f:
+                    clips.append((path, f.read()))
+        if not clips:
+            return jsonify({'error': 'No audio clips provided'}), 400
+
+        # Language-only results are cached under their own prefix so they never
+        # shadow full transcription entries
+        timer('cache_lookup')
+        keys = ['langid:' + content_key(data) for _, data in clips] if result_cache else [None] * len(clips)
+        results = [result_cache.get(key) if key else None for key in keys]
+        pending = [i for i, result in enumerate(results) if result is None]
+
+        if pending:
+            # ffmpeg runs out of process, so decoding parallelises across threads
+            timer('decoding')
+            with ThreadPoolExecutor() as pool:
+                signals = list(pool.map(
+                    lambda i: decode_audio(clips[i][1], suffix='.' + clips[i][0].rsplit('.', 1)[-1]), pending))
+
+            timer('language_id')
+            load_model()
+            batch_size = request.args.get('batch_size', LANGID_BATCH_SIZE, type=int)
+            for i, signal, result in zip(pending, signals, run_inference(classify_signals, signals, batch_size=batch_size)):
+                result['duration'] = len(signal) / SAMPLE_RATE
+                results[i] = result
+                if keys[i]:
+                    result_cache.set(keys[i], result)
+
+        return jsonify({'results': [dict(result, name=name) for (name, _), result in zip(clips, results)]})
+
+    except RequestEntityTooLarge:
+        return upload_too_large()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error processing batch request: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    finally:
+        timer.finish()
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stage latencies and result cache counters"""
+    body = stage_metrics.render()
+    if result_cache:
+        body += '# TYPE atharva_result_cache_total counter\n'
+        body += ''.join(f'atharva_result_cache_total{{outcome="{outcome}"}} {count}\n'
+                        for outcome, count in result_cache.stats.items())
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     # Check if ffmpeg is installed
@@ -198,12 +665,12 @@ if __name__ == '__main__':
         subprocess.run(['ffmpeg', '-version'], capture_output=True, check=True)
         logger.info("FFmpeg is installed and working")
     except (subprocess.SubprocessError, FileNotFoundError):
-        logger.error("FFmpeg is not installed or not in PATH. Please install FFmpeg to convert audio files.")
-        print("ERROR: FFmpeg is required for audio conversion. Please install it before running this app.")
+        logger.error("FFmpeg is not installed or not in PATH. Please install FFmpeg to decode audio files.")
+        print("ERROR: FFmpeg is required for audio decoding. Please install it before running this app.")
         print("  - Ubuntu/Debian: sudo apt-get install ffmpeg")
         print("  - macOS: brew install ffmpeg")
         print("  - Windows: Download from ffmpeg.org and add to PATH")
         exit(1)
         
-    load_model()
+    warm_model()
     app.run(debug=True, port=4000)
\ No newline at end of file
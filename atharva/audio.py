@@ -0,0 +1,151 @@
+import hashlib
+import io
+import os
+import subprocess
+import tempfile
+import wave
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+
+def _ffmpeg_decode_cmd(source, sample_rate):
+    return ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', source,
+            '-f', 'f32le', '-ac', '1', '-ar', str(sample_rate), 'pipe:1']
+
+
+def decode_audio(data, sample_rate=SAMPLE_RATE, suffix=''):
+    """Decode encoded audio bytes to a mono float32 waveform at sample_rate, in memory"""
+    try:
+        proc = subprocess.run(_ffmpeg_decode_cmd('pipe:0', sample_rate), input=data,
+                              capture_output=True, check=True)
+    except subprocess.CalledProcessError as e:
+        # Some containers (e.g. m4a with the moov atom at the end) need a
+        # seekable input, so fall back to a temporary file for those
+        logger.info(f"Pipe decode failed ({e.stderr.decode().strip()}), retrying from a temp file")
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            tmp.write(data)
+        try:
+            proc = subprocess.run(_ffmpeg_decode_cmd(tmp.name, sample_rate), capture_output=True, check=True)
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Failed to decode audio: {e.stderr.decode().strip()}")
+        finally:
+            os.remove(tmp.name)
+    # Copy so the waveform is writable (torch.from_numpy warns on read-only buffers)
+    return np.frombuffer(proc.stdout, dtype=np.float32).copy()
+
+
+def trim_silence(signal, sample_rate=SAMPLE_RATE, threshold_db=-35.0, frame_ms=30):
+    """Drop leading and trailing frames quieter than threshold_db below the loudest frame"""
+    frame = int(sample_rate * frame_ms / 1000)
+    n_frames = len(signal) // frame
+    if n_frames == 0:
+        return signal
+    rms = np.sqrt(np.mean(signal[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    peak = rms.max()
+    if peak == 0:
+        return signal[:0]
+    voiced = np.flatnonzero(rms >= peak * 10 ** (threshold_db / 20))
+    return signal[voiced[0] * frame:(voiced[-1] + 1) * frame]
+
+
+def band_energies(signal, sample_rate=SAMPLE_RATE, frame_ms=100, bands=16, fmin=100.0):
+    """Per-frame energy in log-spaced frequency bands, in dB; shape (frames, bands)"""
+    frame = int(sample_rate * frame_ms / 1000)
+    n_frames = len(signal) // frame
+    if n_frames == 0:
+        return np.zeros((0, bands), dtype=np.float32)
+    frames = signal[:n_frames * frame].reshape(n_frames, frame) * np.hanning(frame)
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+    freqs = np.fft.rfftfreq(frame, 1 / sample_rate)
+    edges = np.searchsorted(freqs, np.geomspace(fmin, sample_rate / 2, bands + 1))
+    energy = np.add.reduceat(power, edges[:-1], axis=1)
+    return (10 * np.log10(energy + 1e-10)).astype(np.float32)
+
+
+def fingerprint(signal, sample_rate=SAMPLE_RATE, frame_ms=100, bands=16, max_frames=600):
+    """Decoded-PCM fingerprint that survives re-encoding to another format.
+
+    Returns (key, signature), or (None, None) for clips too short to tell
+    apart. The key hashes the trimmed duration (0.1 s resolution) and the
+    signs of band-energy differences across both frequency and time, which
+    do not change with gain and barely with codec noise. The signature
+    (duration and the mean, level-normalised spectrum) is stored with the
+    cached result so a key hit can be verified with signatures_match().
+    """
+    signal = trim_silence(signal, sample_rate)
+    energy = band_energies(signal[:max_frames * int(sample_rate * frame_ms / 1000)], sample_rate, frame_ms, bands)
+    if len(energy) < 2:
+        return None, None
+    delta = np.diff(energy, axis=1)
+    bits = np.packbits(np.diff(delta, axis=0) > 0)
+    duration = round(len(signal) / sample_rate, 1)
+    key = 'pcm:' + hashlib.sha256(f'{duration:.1f}:'.encode() + bits.tobytes()).hexdigest()
+    spectrum = energy.mean(axis=0)
+    signature = {
+        'duration': len(signal) / sample_rate,
+        'spectrum': [round(float(x), 2) for x in spectrum - spectrum.mean()],
+    }
+    return key, signature
+
+
+def signatures_match(a, b, max_duration_diff=0.05, max_spectral_distance_db=1.5):
+    """True if two fingerprint signatures have near-identical duration and spectral shape"""
+    if not a or not b or abs(a['duration'] - b['duration']) > max_duration_diff:
+        return False
+    distance = np.sqrt(np.mean((np.asarray(a['spectrum']) - np.asarray(b['spectrum'])) ** 2))
+    return bool(distance <= max_spectral_distance_db)
+
+
+def split_on_silence(signal, sample_rate=SAMPLE_RATE, max_seconds=30.0, min_seconds=5.0,
+                     threshold_db=-35.0, frame_ms=30):
+    """Split a long waveform into (start, end) sample ranges of at most max_seconds.
+
+    Each cut is placed in the middle of the longest quiet run between
+    min_seconds and max_seconds into the current chunk, or at the quietest
+    frame there if the speaker never pauses. The ranges cover the whole signal.
+    """
+    frame = int(sample_rate * frame_ms / 1000)
+    max_frames = int(max_seconds * sample_rate) // frame
+    min_frames = int(min_seconds * sample_rate) // frame
+    n_frames = len(signal) // frame
+    if len(signal) <= max_frames * frame or n_frames == 0:
+        return [(0, len(signal))]
+
+    rms = np.sqrt(np.mean(signal[:n_frames * frame].reshape(n_frames, frame) ** 2, axis=1))
+    quiet = rms < rms.max() * 10 ** (threshold_db / 20)
+
+    bounds = [0]
+    start = 0
+    while n_frames - start > max_frames:
+        # Never leave a tail shorter than min_seconds
+        lo, hi = start + min_frames, min(start + max_frames, n_frames - min_frames)
+        window = quiet[lo:hi]
+        if window.any():
+            # Run boundaries of quiet frames inside the search window
+            edges = np.flatnonzero(np.diff(np.concatenate(([0], window.astype(np.int8), [0]))))
+            run_starts, run_ends = edges[::2], edges[1::2]
+            longest = np.argmax(run_ends - run_starts)
+            cut = lo + (run_starts[longest] + run_ends[longest]) // 2
+        else:
+            cut = lo + int(np.argmin(rms[lo:hi]))
+        bounds.append(int(cut) * frame)
+        start = int(cut)
+    bounds.append(len(signal))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def encode_wav(signal, sample_rate=SAMPLE_RATE):
+    """Encode a float32 waveform as 16-bit PCM WAV bytes"""
+    pcm = (np.clip(signal, -1.0, 1.0) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
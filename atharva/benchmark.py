@@ -0,0 +1,173 @@
+import argparse
+import io
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import app
+from audio import SAMPLE_RATE, decode_audio, encode_wav
+
+
+def load_clips(directory, count, min_seconds, max_seconds):
+    """Decode every allowed clip in directory, or synthesise random-length noise clips"""
+    if directory:
+        names = sorted(n for n in os.listdir(directory) if app.allowed_file(n))
+        clips = []
+        for name in names:
+            with open(os.path.join(directory, name), 'rb') as f:
+                clips.append(decode_audio(f.read(), suffix='.' + name.rsplit('.', 1)[1]))
+        return clips
+    rng = np.random.default_rng(0)
+    lengths = rng.uniform(min_seconds, max_seconds, size=count) * SAMPLE_RATE
+    return [rng.standard_normal(int(n)).astype(np.float32) * 0.1 for n in lengths]
+
+
+def bench_langid(clips, batch_size):
+    """Time sequential detect_language calls against padded classify_signals batches"""
+    app.load_model()
+    app.classify_signals(clips[:batch_size], batch_size=batch_size)  # warm-up
+
+    start = time.perf_counter()
+    for signal in clips:
+        app.detect_language(signal)
+    sequential = time.perf_counter() - start
+
+    start = time.perf_counter()
+    app.classify_signals(clips, batch_size=batch_size)
+    batched = time.perf_counter() - start
+    return sequential, batched
+
+
+def encoded_corpus(directory, count, min_seconds, max_seconds, formats):
+    """(name, encoded bytes) for every allowed clip in directory, or count noise clips per format"""
+    if directory:
+        corpus = []
+        for name in sorted(n for n in os.listdir(directory) if app.allowed_file(n)):
+            with open(os.path.join(directory, name), 'rb') as f:
+                corpus.append((name, f.read()))
+        return corpus
+    corpus = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, signal in enumerate(load_clips(None, count, min_seconds, max_seconds)):
+            wav = encode_wav(signal)
+            for ext in formats:
+                name = f'clip{i:03d}.{ext}'
+                if ext == 'wav':
+                    corpus.append((name, wav))
+                    continue
+                # Encode through a file (m4a needs a seekable output); ffmpeg picks
+                # the container's default codec
+                path = os.path.join(tmp, name)
+                subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-f', 'wav', '-i', 'pipe:0', path],
+                               input=wav, capture_output=True, check=True)
+                with open(path, 'rb') as f:
+                    corpus.append((name, f.read()))
+    return corpus
+
+
+def start_stub_server(latency_ms, jitter_ms):
+    """Local stand-in for the transcription service that answers after latency_ms +- jitter_ms"""
+    rng = np.random.default_rng(0)
+    rng_lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real service
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            with rng_lock:
+                delay = max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+            time.sleep(delay)
+            body = json.dumps({'text': 'stub transcription'}).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/transcribe/'
+
+
+def bench_pipeline(corpus, repeats, concurrency, latency_ms, jitter_ms):
+    """POST every clip to /transcribe against the stub server; returns per-stage duration samples"""
+    server, url = start_stub_server(latency_ms, jitter_ms)
+    app.transcription_client.url = url
+    app.result_cache = None  # every request must run the whole pipeline
+    app.warm_model()
+    app.stage_metrics.keep_samples = True
+    client = app.app.test_client()
+
+    def post(clip):
+        name, data = clip
+        response = client.post('/transcribe', data={'file': (io.BytesIO(data), name)},
+                               content_type='multipart/form-data')
+        if response.status_code != 200:
+            raise RuntimeError(f'{name}: {response.status_code} {response.get_data(as_text=True)}')
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(post, corpus * repeats))
+    finally:
+        server.shutdown()
+    return {stage: values for (event, stage), values in app.stage_metrics.samples.items() if event == 'transcribe'}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the atharva language-ID pipeline')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    langid = subparsers.add_parser('langid', help='Sequential vs batched language ID throughput')
+    langid.add_argument('--dir', help='Directory of audio clips (default: synthetic noise clips)')
+    langid.add_argument('--count', type=int, default=64)
+    langid.add_argument('--min-seconds', type=float, default=2.0)
+    langid.add_argument('--max-seconds', type=float, default=15.0)
+    langid.add_argument('--batch-size', type=int, default=app.LANGID_BATCH_SIZE)
+
+    pipeline = subparsers.add_parser('pipeline', help='Per-stage /transcribe latency against a local stub server')
+    pipeline.add_argument('--dir', help='Directory of audio clips (default: synthetic clips in every allowed format)')
+    pipeline.add_argument('--count', type=int, default=4, help='Synthetic clips per format')
+    pipeline.add_argument('--min-seconds', type=float, default=2.0)
+    pipeline.add_argument('--max-seconds', type=float, default=15.0)
+    pipeline.add_argument('--formats', default=','.join(sorted(app.ALLOWED_EXTENSIONS)))
+    pipeline.add_argument('--latency-ms', type=float, default=200.0, help='Stub transcription latency')
+    pipeline.add_argument('--jitter-ms', type=float, default=50.0)
+    pipeline.add_argument('--repeats', type=int, default=3)
+    pipeline.add_argument('--concurrency', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'langid':
+        clips = load_clips(args.dir, args.count, args.min_seconds, args.max_seconds)
+        audio_seconds = sum(len(c) for c in clips) / SAMPLE_RATE
+        sequential, batched = bench_langid(clips, args.batch_size)
+
+        print(f'{len(clips)} clips, {audio_seconds:.1f}s of audio, batch size {args.batch_size}')
+        print(f'sequential : {len(clips) / sequential:8.2f} clips/sec {audio_seconds / sequential:8.1f}x realtime')
+        print(f'batched    : {len(clips) / batched:8.2f} clips/sec {audio_seconds / batched:8.1f}x realtime')
+        print(f'speedup    : {sequential / batched:8.2f}x')
+        return
+
+    corpus = encoded_corpus(args.dir, args.count, args.min_seconds, args.max_seconds, args.formats.split(','))
+    samples = bench_pipeline(corpus, args.repeats, args.concurrency, args.latency_ms, args.jitter_ms)
+
+    print(f'{len(corpus)} clips x {args.repeats} repeats, concurrency {args.concurrency}, '
+          f'stub latency {args.latency_ms:.0f}+-{args.jitter_ms:.0f} ms')
+    print(f'{"stage":<14}{"n":>6}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}')
+    for stage, values in samples.items():
+        p50, p95, p99 = np.percentile(np.asarray(values) * 1000, [50, 95, 99])
+        print(f'{stage:<14}{len(values):>6}{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
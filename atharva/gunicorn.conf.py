@@ -0,0 +1,17 @@
+# Run with: gunicorn -c gunicorn.conf.py app:app
+# The app (and the language-ID model) is imported once in the master and
+# shared copy-on-write by the forked workers.
+import os
+
+os.environ.setdefault('LANGID_PRELOAD', '1')
+
+preload_app = True
+bind = os.getenv('BIND', '0.0.0.0:4000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+timeout = 300
+
+
+def post_fork(server, worker):
+    import app
+    app.configure_threads()
@@ -0,0 +1,147 @@
+import io
+import os
+import threading
+import time
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+class MultipartBody(io.RawIOBase):
+    """multipart/form-data body that streams its file part instead of building one big buffer.
+
+    The file source may be bytes (sent as memoryview slices, never copied) or
+    a path / binary file object (read in blocks). It has a known length, so
+    the request goes out with Content-Length rather than chunked encoding,
+    and it is seekable, so a retried request can rewind it.
+    """
+
+    def __init__(self, fields, name, filename, source, content_type='application/octet-stream'):
+        self.boundary = uuid.uuid4().hex
+        self._owns_file = isinstance(source, (str, os.PathLike))
+        if self._owns_file:
+            source = open(source, 'rb')
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            file_part = memoryview(source).cast('B')
+            file_size = len(file_part)
+        else:
+            file_part = source
+            file_size = os.fstat(source.fileno()).st_size - source.tell()
+            self._file_start = source.tell()
+
+        head = b''.join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode()
+            for key, value in fields.items()
+        )
+        head += (f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                 f'Content-Type: {content_type}\r\n\r\n').encode()
+        tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        # (part, start offset within the body, length)
+        self._parts = []
+        offset = 0
+        for part, length in ((memoryview(head), len(head)), (file_part, file_size), (memoryview(tail), len(tail))):
+            self._parts.append((part, offset, length))
+            offset += length
+        self._length = offset
+        self._pos = 0
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self._length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: self._length}[whence]
+        self._pos = min(max(base + offset, 0), self._length)
+        return self._pos
+
+    def read(self, size=-1):
+        if self._pos >= self._length:
+            return b''
+        for part, start, length in self._parts:
+            if self._pos < start + length:
+                break
+        within = self._pos - start
+        size = length - within if size is None or size < 0 else min(size, length - within)
+        if isinstance(part, memoryview):
+            chunk = part[within:within + size]
+        else:
+            part.seek(self._file_start + within)
+            chunk = part.read(size)
+        self._pos += len(chunk)
+        return chunk
+
+    def close(self):
+        if self._owns_file and not self.closed:
+            self._parts[1][0].close()
+        super().close()
+
+
+class TranscriptionClient:
+    """Keep-alive connection pool to the transcription service.
+
+    At most max_concurrency uploads are in flight per process, and background
+    uploads (jobs) may hold at most max_background of those slots, so
+    interactive requests always have the rest. Connection failures are retried with backoff (the request never reached the server);
+    read timeouts and HTTP errors are not, so an upload is never processed twice.
+    """
+
+    def __init__(self, url, pool_size=8, max_concurrency=4, connect_timeout=10.0, read_timeout=300.0,
+                 retries=2, backoff=0.5, max_background=None):
+        self.url = url
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._background_slots = threading.BoundedSemaphore(max_background or max(1, max_concurrency // 2))
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        # Pooled sockets must not be shared across fork()
+        if self._pid != os.getpid():
+            session = requests.Session()
+            retry = Retry(total=self.retries, connect=self.retries, read=0, status=0, other=0,
+                          backoff_factor=self.backoff)
+            session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry))
+            session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry))
+            self._session, self._pid = session, os.getpid()
+        return self._session
+
+    def transcribe(self, filename, source, mimetype, fields, wait=None, background=False):
+        """POST source (bytes, path or binary file) with form fields; waits up to wait seconds for a slot"""
+        deadline = None if wait is None else time.monotonic() + wait
+        if background and not self._background_slots.acquire(timeout=wait):
+            raise ServiceBusy('Transcription service is busy with background jobs')
+        try:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            if not self._slots.acquire(timeout=remaining):
+                raise ServiceBusy('Transcription service is busy, retry later or use /transcribe/jobs')
+            try:
+                with MultipartBody(fields, 'file', filename, source, mimetype or 'application/octet-stream') as body:
+                    return self.session.post(self.url, data=body, headers={'Content-Type': body.content_type},
+                                             timeout=self.timeout)
+            finally:
+                self._slots.release()
+        finally:
+            if background:
+                self._background_slots.release()
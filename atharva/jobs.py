@@ -0,0 +1,260 @@
+import ipaddress
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def check_callback_url(url, allowed_hosts=()):
+    """Raise ValueError unless url is an http(s) URL the server may POST results to.
+
+    With allowed_hosts, only those host names are accepted and None is
+    returned. Otherwise every address the host resolves to must be public:
+    loopback, private, link-local, reserved and multicast targets are refused,
+    so a client cannot make the server call internal services. The checked
+    address is returned so the caller can connect to it without resolving
+    the name again.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError('callback_url must be an http(s) URL')
+    host = parsed.hostname.lower()
+    if allowed_hosts:
+        if host not in allowed_hosts:
+            raise ValueError(f'callback_url host {host} is not allowed')
+        return None
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, parsed.port or 80, proto=socket.IPPROTO_TCP)}
+    except socket.gaierror:
+        raise ValueError(f'callback_url host {host} does not resolve')
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not ip.is_global or ip.is_multicast:
+            raise ValueError(f'callback_url host {host} resolves to a non-public address')
+    return sorted(addresses)[0].split('%')[0]
+
+
+class _PinnedAdapter(HTTPAdapter):
+    # Verifies TLS against the original host name while the URL carries an IP
+    def __init__(self, hostname, **kwargs):
+        self._hostname = hostname
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['server_hostname'] = self._hostname
+        kwargs['assert_hostname'] = self._hostname
+        super().init_poolmanager(*args, **kwargs)
+
+
+def post_callback(url, address, payload, timeout):
+    """POST payload to url, connecting to the already checked address if one is given.
+
+    Resolving the name a second time would let a DNS answer that changed
+    since the check (rebinding) point the request at an internal service.
+    """
+    if address is None:
+        return requests.post(url, json=payload, timeout=timeout, allow_redirects=False)
+    parsed = urlparse(url)
+    ip_host = f'[{address}]' if ':' in address else address
+    netloc = f'{ip_host}:{parsed.port}' if parsed.port else ip_host
+    with requests.Session() as session:
+        session.mount(f'{parsed.scheme}://', _PinnedAdapter(parsed.hostname))
+        return session.post(parsed._replace(netloc=netloc).geturl(), json=payload, timeout=timeout,
+                            allow_redirects=False, headers={'Host': parsed.netloc.rpartition('@')[2]})
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """Local background job queue for long-running requests.
+
+    Jobs run on a bounded thread pool in the process that accepted them; their
+    status lives in SQLite so any server process can answer a poll. Each job
+    function receives a stage(name) callable as its first argument and records
+    how long every stage took. Finished jobs are kept for retention_seconds.
+
+    Each row records the host and pid that runs it, and a heartbeat thread
+    keeps updated_at fresh while the process is alive. Jobs whose process on
+    this host is gone (a restart or crash), or whose owner on another host has
+    not been heard from for stale_seconds, are marked failed instead of
+    reporting 'running' forever. A failed job is never moved back to done.
+    """
+
+    def __init__(self, path, workers=2, max_pending=100, retention_seconds=3600, callback_timeout=10,
+                 callback_hosts=(), stale_seconds=3600):
+        self.path = path
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retention_seconds = retention_seconds
+        self.callback_timeout = callback_timeout
+        self.callback_hosts = tuple(callback_hosts)
+        self.stale_seconds = stale_seconds
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = None
+        self._connection = None
+        self._pid = None
+
+    @property
+    def _db(self):
+        # Neither SQLite connections nor pool threads survive fork()
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, '
+                                     'stage TEXT, stages TEXT, result TEXT, error TEXT, '
+                                     'created_at REAL, updated_at REAL, owner TEXT)')
+            columns = {row[1] for row in self._connection.execute('PRAGMA table_info(jobs)')}
+            if 'owner' not in columns:
+                self._connection.execute('ALTER TABLE jobs ADD COLUMN owner TEXT')
+            self._connection.commit()
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+            self._pending = 0
+            self._pid = os.getpid()
+            self._owner = f'{socket.gethostname()}:{self._pid}'
+            threading.Thread(target=self._heartbeat, args=(self._pid,), name='job-heartbeat', daemon=True).start()
+            self._reap(self._connection.execute("SELECT id, owner, updated_at FROM jobs "
+                                                "WHERE status IN ('queued', 'running')").fetchall())
+        return self._connection
+
+    def _heartbeat(self, pid):
+        # Long stages only touch updated_at when they start, so refresh it for
+        # this process's unfinished jobs until the process (or its fork) changes
+        while True:
+            time.sleep(max(self.stale_seconds / 4, 0.05))
+            if self._pid != pid:
+                return
+            with self._lock:
+                self._connection.execute("UPDATE jobs SET updated_at = ? "
+                                         "WHERE owner = ? AND status IN ('queued', 'running')",
+                                         (time.time(), self._owner))
+                self._connection.commit()
+
+    def _reap(self, rows):
+        """Mark unfinished jobs failed if their process is gone or has stopped sending heartbeats"""
+        now = time.time()
+        host = socket.gethostname()
+        orphaned = []
+        for job_id, owner, updated_at in rows:
+            owner_host, _, owner_pid = (owner or ':').rpartition(':')
+            if owner is None or not owner_pid.isdigit():
+                dead = True
+            elif owner_host == host:
+                # Same host: the pid answers directly, however long a stage runs
+                dead = not _pid_alive(int(owner_pid))
+            else:
+                dead = updated_at <= now - self.stale_seconds
+            if dead:
+                orphaned.append((now, job_id))
+        if orphaned:
+            self._connection.executemany("UPDATE jobs SET status = 'failed', "
+                                         "error = 'Server stopped before the job finished', updated_at = ? "
+                                         "WHERE id = ? AND status IN ('queued', 'running')", orphaned)
+            self._connection.commit()
+            logger.warning(f"Marked {len(orphaned)} orphaned jobs as failed")
+        return len(orphaned)
+
+    def check_callback(self, url):
+        return check_callback_url(url, self.callback_hosts)
+
+    def submit(self, fn, *args, callback_url=None):
+        """Queue fn(stage, *args) and return the new job id"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            db = self._db
+            if self._pending >= self.max_pending:
+                raise QueueFull(f'{self._pending} jobs already pending')
+            self._pending += 1
+            db.execute('DELETE FROM jobs WHERE status IN (?, ?) AND updated_at <= ?',
+                       ('done', 'failed', now - self.retention_seconds))
+            db.execute('INSERT INTO jobs VALUES (?, ?, ?, ?, NULL, NULL, ?, ?, ?)',
+                       (job_id, 'queued', 'queued', '{}', now, now, self._owner))
+            db.commit()
+            self._executor.submit(self._run, job_id, fn, args, callback_url)
+        return job_id
+
+    def get(self, job_id):
+        with self._lock:
+            db = self._db
+            unfinished = db.execute("SELECT id, owner, updated_at FROM jobs "
+                                    "WHERE id = ? AND status IN ('queued', 'running')", (job_id,)).fetchall()
+            if unfinished:
+                self._reap(unfinished)
+            row = db.execute('SELECT id, status, stage, stages, result, error, created_at, updated_at '
+                                   'FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(('id', 'status', 'stage', 'stages', 'result', 'error', 'created_at', 'updated_at'), row))
+        job['stages'] = json.loads(job['stages'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        for name in ('stages', 'result'):
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        with self._lock:
+            # A job already reaped as failed stays failed
+            self._db.execute(f"UPDATE jobs SET {', '.join(f'{k} = ?' for k in fields)} "
+                             "WHERE id = ? AND status IN ('queued', 'running')",
+                             (*fields.values(), job_id))
+            self._db.commit()
+
+    def _run(self, job_id, fn, args, callback_url):
+        stages = {}
+        current = [None, 0.0]
+
+        def finish_stage():
+            if current[0] is not None:
+                stages[current[0]] = round(time.perf_counter() - current[1], 4)
+
+        def stage(name):
+            finish_stage()
+            current[:] = [name, time.perf_counter()]
+            self._update(job_id, status='running', stage=name, stages=stages)
+
+        try:
+            result = fn(stage, *args)
+            finish_stage()
+            self._update(job_id, status='done', stage='done', stages=stages, result=result)
+        except Exception as e:
+            logger.error(f"Job {job_id} failed in stage {current[0]}: {str(e)}")
+            finish_stage()
+            self._update(job_id, status='failed', stages=stages, error=str(e))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+        if callback_url:
+            try:
+                # Re-check at send time in case the host now resolves elsewhere
+                address = self.check_callback(callback_url)
+                post_callback(callback_url, address, self.get(job_id), self.callback_timeout)
+            except (ValueError, requests.RequestException) as e:
+                logger.warning(f"Callback for job {job_id} to {callback_url} failed: {str(e)}")
@@ -0,0 +1,92 @@
+import bisect
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+class StageMetrics:
+    """Per-(event, stage) latency histograms, rendered in the Prometheus text format.
+
+    Counts are per process; with several server workers each one reports
+    its own. Set keep_samples to also keep every raw duration (for benchmarks).
+    """
+
+    def __init__(self, name='atharva_stage_seconds', buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.keep_samples = False
+        self.samples = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, event, stage, seconds):
+        key = (event, stage)
+        with self._lock:
+            counts, total = self._histograms.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self._histograms[key] = (counts, total + seconds)
+            if self.keep_samples:
+                self.samples.setdefault(key, []).append(seconds)
+
+    def render(self):
+        lines = [f'# HELP {self.name} Time spent in each request pipeline stage',
+                 f'# TYPE {self.name} histogram']
+        with self._lock:
+            for (event, stage), (counts, total) in sorted(self._histograms.items()):
+                labels = f'event="{event}",stage="{stage}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total}')
+                lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+class StageTimer:
+    """Callable stage(name) that times consecutive pipeline stages.
+
+    Each call closes the previous stage; finish() closes the last one, records
+    every stage (plus 'total') in metrics and logs one JSON line per request.
+    """
+
+    def __init__(self, metrics, event, request_id=None):
+        self.metrics = metrics
+        self.event = event
+        self.request_id = request_id or uuid.uuid4().hex
+        self.stages = {}
+        self._started = time.perf_counter()
+        self._current = None
+        self._current_started = None
+
+    def __call__(self, name):
+        now = time.perf_counter()
+        self._close(now)
+        self._current, self._current_started = name, now
+
+    def _close(self, now):
+        if self._current is not None:
+            self.stages[self._current] = self.stages.get(self._current, 0.0) + now - self._current_started
+            self._current = None
+
+    def finish(self, **fields):
+        now = time.perf_counter()
+        self._close(now)
+        total = now - self._started
+        for stage, seconds in self.stages.items():
+            self.metrics.observe(self.event, stage, seconds)
+        self.metrics.observe(self.event, 'total', total)
+        logger.info(json.dumps({
+            'event': self.event,
+            'request_id': self.request_id,
+            'stages': {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            'total': round(total, 4),
+            **fields,
+        }))
+        return self.stages
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(data):
+    """Cache key for the exact uploaded bytes"""
+    return 'sha256:' + hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """Bounded in-memory LRU in front of a SQLite store, both with a TTL.
+
+    Values are JSON-serialisable dicts. Memory hits cost a dict lookup and
+    never wait on SQLite; disk hits are promoted into memory. Expired rows
+    and rows past max_disk_items (least recently used first) are pruned every
+    maintenance_every writes rather than on each one.
+    """
+
+    def __init__(self, path, max_memory_items=1024, max_disk_items=100000, ttl_seconds=7 * 86400,
+                 maintenance_every=256):
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl_seconds = ttl_seconds
+        self.maintenance_every = maintenance_every
+        self._memory = OrderedDict()
+        # _lock guards the memory tier and stats, _db_lock the SQLite connection
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+        self.path = path
+        self._connection = None
+        self._pid = None
+
+    @property
+    def _db(self):
+        # SQLite connections must not cross fork(), so each process opens its own
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS results '
+                                     '(key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed_at)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS results_expires ON results (expires_at)')
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return entry[1]
+
+        with self._db_lock:
+            db = self._db
+            row = db.execute('SELECT value, expires_at FROM results WHERE key = ? AND expires_at > ?',
+                             (key, now)).fetchone()
+            if row is not None:
+                db.execute('UPDATE results SET accessed_at = ? WHERE key = ?', (now, key))
+                db.commit()
+
+        with self._lock:
+            if row is None:
+                self._memory.pop(key, None)
+                self.stats['misses'] += 1
+                return None
+            value = json.loads(row[0])
+            self._remember(key, row[1], value)
+            self.stats['disk_hits'] += 1
+            return value
+
+    def set(self, key, value):
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._writes += 1
+            maintain = self._writes % self.maintenance_every == 0
+        with self._db_lock:
+            db = self._db
+            db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                       (key, json.dumps(value), expires_at, now))
+            if maintain:
+                self._prune(db, now)
+            db.commit()
+
+    def _prune(self, db, now):
+        db.execute('DELETE FROM results WHERE expires_at <= ?', (now,))
+        excess = db.execute('SELECT COUNT(*) FROM results').fetchone()[0] - self.max_disk_items
+        if excess > 0:
+            db.execute('DELETE FROM results WHERE key IN (SELECT key FROM results '
+                       'ORDER BY accessed_at LIMIT ?)', (excess,))
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
@@ -4,12 +4,31 @@ import json
 import os
 from dotenv import load_dotenv
 from flask_cors import CORS
+from concurrent.futures import ThreadPoolExecutor
+from translation_cache import TranslationCache, normalize_text
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
 
+# Cache of successful translations: in-process LRU in front of SQLite
+translation_cache = None
+if os.getenv("TRANSLATION_CACHE_ENABLED", "1") == "1":
+    translation_cache = TranslationCache(
+        os.path.join(os.getenv("TRANSLATION_CACHE_DIR", "cache"), "translations.sqlite3"),
+        max_memory_items=int(os.getenv("TRANSLATION_CACHE_MEMORY_ITEMS", "10000")),
+        max_disk_items=int(os.getenv("TRANSLATION_CACHE_DISK_ITEMS", "1000000")),
+        ttl_seconds=float(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", str(30 * 86400))),
+    )
+
+# Limits for packing many sentences into one Bhashini pipeline call, and for
+# how many of those calls /api/translate/batch makes at once
+BHASHINI_MAX_BATCH_ITEMS = int(os.getenv("BHASHINI_MAX_BATCH_ITEMS", "50"))
+BHASHINI_MAX_BATCH_CHARS = int(os.getenv("BHASHINI_MAX_BATCH_CHARS", "5000"))
+BHASHINI_MAX_CONCURRENCY = int(os.getenv("BHASHINI_MAX_CONCURRENCY", "4"))
+BATCH_MAX_TEXTS = int(os.getenv("BATCH_MAX_TEXTS", "1000"))
+
 # Dictionary of supported languages with their codes
 LANGUAGES = {
     "English": "en",
@@ -40,6 +59,11 @@ LANGUAGES = {
 # Function to translate text
 def translate_text(source_lang, message, target_lang, service_id):
     """Translate text using Bhashini's translation API"""
+    return translate_texts(source_lang, [message], target_lang, service_id)
+
+# Function to translate several texts in one pipeline call
+def translate_texts(source_lang, messages, target_lang, service_id):
+    """Translate a list of texts with a single Bhashini pipeline request"""
     url = 'https://dhruva-api.bhashini.gov.in/services/inference/pipeline'
     
     headers = {
@@ -53,6 +77,7 @@ def translate_text(source_lang, message, target_lang, service_id):
                 {
                     "source": message
                 }
+                for message in messages
             ]
         },
         "pipelineTasks": [
@@ -84,6 +109,31 @@ def extract_translation(response):
     except (KeyError, IndexError, TypeError) as e:
         return {"error": f"Error extracting translation: {e}", "response": response}
 
+# Function to extract every translated text from a batched response
+def extract_translations(response, count):
+    """Extract the translated texts, in input order, from a batched API response"""
+    try:
+        outputs = response["pipelineResponse"][0]["output"]
+        if len(outputs) != count:
+            return {"error": f"Expected {count} translations, got {len(outputs)}", "response": response}
+        return [output["target"] for output in outputs]
+    except (KeyError, IndexError, TypeError) as e:
+        return {"error": f"Error extracting translation: {e}", "response": response}
+
+# Function to pack texts into as few pipeline calls as the payload limits allow
+def pack_texts(texts, max_items=BHASHINI_MAX_BATCH_ITEMS, max_chars=BHASHINI_MAX_BATCH_CHARS):
+    """Split texts, in order, into chunks of at most max_items texts and max_chars characters"""
+    chunks, chunk, chars = [], [], 0
+    for text in texts:
+        if chunk and (len(chunk) == max_items or chars + len(text) > max_chars):
+            chunks.append(chunk)
+            chunk, chars = [], 0
+        chunk.append(text)
+        chars += len(text)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
 @app.route('/api/translate', methods=['POST'])
 def translate():
     data = request.json
@@ -94,6 +144,13 @@ def translate():
 
     if not source_language or not target_language or not text_to_translate:
         return jsonify({"error": "Please provide source_language, target_language, and text"}), 400
+    if not isinstance(text_to_translate, str):
+        return jsonify({"error": "text must be a string"}), 400
+
+    if translation_cache:
+        cached = translation_cache.get(source_language, target_language, service_id, text_to_translate)
+        if cached is not None:
+            return jsonify({"translated_text": cached})
 
     result = translate_text(source_language, text_to_translate, target_language, service_id)
     
@@ -102,10 +159,95 @@ def translate():
 
     translated_text = extract_translation(result)
     
-    if "error" in translated_text:
+    if isinstance(translated_text, dict):
         return jsonify(translated_text), 500
 
+    if translation_cache:
+        translation_cache.set(source_language, target_language, service_id, text_to_translate, translated_text)
+
     return jsonify({"translated_text": translated_text})
 
+@app.route('/api/translate/batch', methods=['POST'])
+def translate_batch():
+    """Translate many texts, possibly with different language pairs, in a few pipeline calls.
+
+    Body: {"texts": [...], "source_language", "target_language", "service_id"}.
+    Each entry of texts is a string or an object with its own text and any of
+    the language/service fields, which override the top-level defaults.
+    """
+    data = request.json or {}
+    texts = data.get('texts')
+    if not isinstance(texts, list) or not texts:
+        return jsonify({"error": "Please provide a non-empty texts list"}), 400
+    if len(texts) > BATCH_MAX_TEXTS:
+        return jsonify({"error": f"At most {BATCH_MAX_TEXTS} texts per request"}), 400
+
+    # Group item positions by (source, target, service) and, within a group,
+    # by normalized text so duplicates are translated once
+    groups = {}
+    for i, item in enumerate(texts):
+        if isinstance(item, str):
+            item = {"text": item}
+        if not isinstance(item, dict):
+            return jsonify({"error": f"texts[{i}] must be a string or an object"}), 400
+        source_language = item.get('source_language', data.get('source_language'))
+        target_language = item.get('target_language', data.get('target_language'))
+        service_id = item.get('service_id', data.get('service_id', os.getenv("DEFAULT_SERVICE_ID")))
+        text = item.get('text')
+        if not source_language or not target_language or not isinstance(text, str) or not text:
+            return jsonify({"error": f"texts[{i}] needs source_language, target_language, and text"}), 400
+        group = groups.setdefault((source_language, target_language, service_id), {})
+        group.setdefault(normalize_text(text), (text, []))[1].append(i)
+
+    results = [None] * len(texts)
+    cache_hits = 0
+    calls = []
+    for (source_language, target_language, service_id), unique in groups.items():
+        originals = [text for text, _ in unique.values()]
+        positions = [indices for _, indices in unique.values()]
+        cached = (translation_cache.get_many(source_language, target_language, service_id, originals)
+                  if translation_cache else [None] * len(originals))
+        missing = []
+        for text, indices, translation in zip(originals, positions, cached):
+            if translation is None:
+                missing.append((text, indices))
+                continue
+            cache_hits += len(indices)
+            for i in indices:
+                results[i] = {"translated_text": translation}
+        by_text = dict(missing)
+        for chunk in pack_texts([text for text, _ in missing]):
+            calls.append((source_language, target_language, service_id, chunk, [by_text[text] for text in chunk]))
+
+    # Function to run one packed pipeline call and fill in its results
+    def run_call(call):
+        source_language, target_language, service_id, chunk, positions = call
+        response = translate_texts(source_language, chunk, target_language, service_id)
+        translations = response if "error" in response else extract_translations(response, len(chunk))
+        if isinstance(translations, dict):
+            for indices in positions:
+                for i in indices:
+                    results[i] = {"error": translations["error"]}
+            return
+        for indices, translation in zip(positions, translations):
+            for i in indices:
+                results[i] = {"translated_text": translation}
+        if translation_cache:
+            translation_cache.set_many(source_language, target_language, service_id, zip(chunk, translations))
+
+    if calls:
+        with ThreadPoolExecutor(max_workers=min(BHASHINI_MAX_CONCURRENCY, len(calls))) as pool:
+            list(pool.map(run_call, calls))
+
+    status = 500 if all("error" in result for result in results) else 200
+    return jsonify({"results": results, "upstream_calls": len(calls), "cache_hits": cache_hits}), status
+
+@app.route('/api/translate/cache/stats', methods=['GET'])
+def translation_cache_stats():
+    """Hit/miss counters and hit ratio of the translation cache"""
+    if not translation_cache:
+        return jsonify({"enabled": False})
+    return jsonify(dict(translation_cache.stats, enabled=True))
+
 if __name__ == '__main__':
     app.run(debug=True, port=6004)
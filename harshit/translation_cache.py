@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+# Function to normalize text before hashing it into a cache key
+def normalize_text(text):
+    """Unicode-normalize and collapse whitespace so trivially different strings share an entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+# Function to build the cache key for one translation
+def translation_key(source_lang, target_lang, service_id, text):
+    """Cache key: (source_lang, target_lang, service_id, sha256 of the normalized text)"""
+    digest = hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+    return f"{source_lang}:{target_lang}:{service_id}:{digest}"
+
+
+class TranslationCache:
+    """In-process LRU in front of a SQLite store, both with a TTL.
+
+    Memory hits are a dict lookup and never wait on SQLite; disk hits are
+    promoted into memory. Expired rows and rows past max_disk_items (least
+    recently used first) are pruned every maintenance_every writes.
+    """
+
+    def __init__(self, path, max_memory_items=10000, max_disk_items=1000000, ttl_seconds=30 * 86400,
+                 maintenance_every=256):
+        self.path = path
+        self.max_memory_items = max_memory_items
+        self.max_disk_items = max_disk_items
+        self.ttl_seconds = ttl_seconds
+        self.maintenance_every = maintenance_every
+        self._memory = OrderedDict()
+        # _lock guards the memory tier and counters, _db_lock the SQLite connection
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._connection = None
+        self._pid = None
+
+    @property
+    def _db(self):
+        # SQLite connections must not cross fork(), so each process opens its own
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS translations "
+                                     "(key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS translations_accessed "
+                                     "ON translations (accessed_at)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS translations_expires "
+                                     "ON translations (expires_at)")
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, source_lang, target_lang, service_id, text):
+        """Cached translation, or None"""
+        return self.get_many(source_lang, target_lang, service_id, [text])[0]
+
+    def get_many(self, source_lang, target_lang, service_id, texts):
+        """Cached translations for texts (None where missing), with one disk query for the misses"""
+        now = time.time()
+        keys = [translation_key(source_lang, target_lang, service_id, text) for text in texts]
+        results = [None] * len(keys)
+        disk_keys = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                entry = self._memory.get(key)
+                if entry is not None and entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self._counts["memory_hits"] += 1
+                    results[i] = entry[1]
+                else:
+                    disk_keys.setdefault(key, []).append(i)
+        if not disk_keys:
+            return results
+
+        found = {}
+        unique = list(disk_keys)
+        with self._db_lock:
+            db = self._db
+            # Stay well under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = db.execute(f"SELECT key, value, expires_at FROM translations WHERE key IN "
+                                  f"({','.join('?' * len(chunk))}) AND expires_at > ?", (*chunk, now)).fetchall()
+                found.update((key, (json.loads(value), expires_at)) for key, value, expires_at in rows)
+            if found:
+                db.executemany("UPDATE translations SET accessed_at = ? WHERE key = ?", [(now, key) for key in found])
+                db.commit()
+
+        with self._lock:
+            for key, positions in disk_keys.items():
+                if key in found:
+                    value, expires_at = found[key]
+                    self._remember(key, expires_at, value)
+                    self._counts["disk_hits"] += len(positions)
+                    for i in positions:
+                        results[i] = value
+                else:
+                    self._memory.pop(key, None)
+                    self._counts["misses"] += len(positions)
+        return results
+
+    def set(self, source_lang, target_lang, service_id, text, translation):
+        self.set_many(source_lang, target_lang, service_id, [(text, translation)])
+
+    def set_many(self, source_lang, target_lang, service_id, pairs):
+        """Store (text, translation) pairs in both tiers"""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        rows = []
+        with self._lock:
+            for text, translation in pairs:
+                key = translation_key(source_lang, target_lang, service_id, text)
+                self._remember(key, expires_at, translation)
+                rows.append((key, json.dumps(translation), expires_at, now))
+            # Prune whenever the write count crosses a multiple of maintenance_every
+            maintain = (self._writes + len(rows)) // self.maintenance_every > self._writes // self.maintenance_every
+            self._writes += len(rows)
+        with self._db_lock:
+            db = self._db
+            db.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)", rows)
+            if maintain:
+                self._prune(db, now)
+            db.commit()
+
+    def _prune(self, db, now):
+        db.execute("DELETE FROM translations WHERE expires_at <= ?", (now,))
+        excess = db.execute("SELECT COUNT(*) FROM translations").fetchone()[0] - self.max_disk_items
+        if excess > 0:
+            db.execute("DELETE FROM translations WHERE key IN (SELECT key FROM translations "
+                       "ORDER BY accessed_at LIMIT ?)", (excess,))
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    @property
+    def stats(self):
+        """Hit counters and hit ratio for this process since start"""
+        with self._lock:
+            counts = dict(self._counts)
+            memory_items = len(self._memory)
+        lookups = sum(counts.values())
+        hits = counts["memory_hits"] + counts["disk_hits"]
+        return dict(counts, lookups=lookups, hit_ratio=hits / lookups if lookups else 0.0, memory_items=memory_items)
@@ -0,0 +1,155 @@
+import queue as queue_lib
+import random
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from .deepQ_learn import DQN
+
+
+def actor_epsilons(num_actors, base=0.4, alpha=7.0):
+    # Ape-X schedule: each actor explores at a fixed, different rate
+    if num_actors == 1:
+        return [base]
+    return [base ** (1 + alpha * i / (num_actors - 1)) for i in range(num_actors)]
+
+
+def _actor(actor_id, env_fn, shared_model, version, transitions, stop, epsilon, sync_every, chunk_size):
+    # Runs in its own process: acts with a local copy of the network, ships
+    # experience to the learner in chunks and re-syncs weights when the
+    # learner has published a newer version.
+    torch.set_num_threads(1)
+    np.random.seed(actor_id)
+    random.seed(actor_id)
+
+    env = env_fn()
+    model = DQN(shared_model.fc1.in_features, shared_model.fc3.out_features)
+    local_version = -1
+
+    chunk = ([], [], [], [], [])
+    episode_rewards = []
+    total_reward = 0.0
+    state = env.reset()
+    step = 0
+    while not stop.is_set():
+        if step % sync_every == 0 and version.value != local_version:
+            with version.get_lock():
+                model.load_state_dict(shared_model.state_dict())
+                local_version = version.value
+
+        if np.random.rand() <= epsilon:
+            action = random.randrange(env.action_space.n)
+        else:
+            with torch.inference_mode():
+                action = int(model(torch.as_tensor(state, dtype=torch.float32).reshape(1, -1)).argmax())
+
+        next_state, reward, done, _ = env.step(action)
+        for column, value in zip(chunk, (state, action, reward, next_state, done)):
+            column.append(value)
+        total_reward += reward
+        state = next_state
+        if done:
+            episode_rewards.append(total_reward)
+            total_reward = 0.0
+            state = env.reset()
+
+        step += 1
+        if len(chunk[1]) >= chunk_size:
+            payload = (
+                np.asarray(chunk[0], dtype=np.float32),
+                np.asarray(chunk[1], dtype=np.int64),
+                np.asarray(chunk[2], dtype=np.float32),
+                np.asarray(chunk[3], dtype=np.float32),
+                np.asarray(chunk[4], dtype=np.float32),
+            )
+            # Don't block forever on a full queue once the learner has stopped
+            while not stop.is_set():
+                try:
+                    transitions.put((actor_id, payload, episode_rewards), timeout=1.0)
+                    break
+                except queue_lib.Full:
+                    continue
+            chunk = ([], [], [], [], [])
+            episode_rewards = []
+    env.close()
+
+
+def _drain(transitions, agent, timeout):
+    # Move every queued chunk into the learner's replay buffer
+    received = 0
+    try:
+        item = transitions.get(timeout=timeout)
+        while True:
+            actor_id, payload, episode_rewards = item
+            agent.memory.add_batch(*payload)
+            received += len(payload[1])
+            for reward in episode_rewards:
+                print(f"Actor: {actor_id}, Episode Reward: {reward}, Buffer: {len(agent.memory)}")
+            item = transitions.get_nowait()
+    except queue_lib.Empty:
+        pass
+    return received
+
+
+def _check_actors(actors, reported):
+    # Actors only exit once `stop` is set, so any earlier exit is a crash
+    # (e.g. env_fn raised because Mongo is unreachable). Report each death
+    # once and fail the learner when nothing is left to produce experience.
+    for i, actor in enumerate(actors):
+        if i not in reported and not actor.is_alive():
+            reported.add(i)
+            print(f"Actor {i} exited with code {actor.exitcode}")
+    if len(reported) == len(actors):
+        raise RuntimeError(f"All {len(actors)} actors exited; exit codes {[a.exitcode for a in actors]}")
+
+
+def train_apex(env_fn, agent, num_actors=None, updates=100000, batch_size=256, warmup=1000,
+               publish_every=50, sync_every=400, chunk_size=64):
+    # Ape-X style training: `num_actors` processes collect experience from
+    # their own env_fn() (e.g. functools.partial(MongoDBEnv, uri, db) or a
+    # simulator) while this process is the single learner that owns the replay
+    # buffer and publishes weights into shared memory every `publish_every`
+    # updates. env_fn must be picklable and is only called inside the actors.
+    num_actors = num_actors or max(1, mp.cpu_count() - 1)
+    shared_model = DQN(agent.state_dim, agent.action_dim)
+    shared_model.load_state_dict(agent.model.state_dict())
+    shared_model.share_memory()
+    version = mp.Value("i", 0)
+    transitions = mp.Queue(maxsize=num_actors * 8)
+    stop = mp.Event()
+
+    actors = [
+        mp.Process(target=_actor, daemon=True, args=(
+            i, env_fn, shared_model, version, transitions, stop, epsilon, sync_every, chunk_size))
+        for i, epsilon in enumerate(actor_epsilons(num_actors))
+    ]
+    for actor in actors:
+        actor.start()
+
+    received = 0
+    dead = set()
+    try:
+        for update in range(1, updates + 1):
+            received += _drain(transitions, agent, timeout=0.0)
+            _check_actors(actors, dead)
+            while len(agent.memory) < warmup:
+                received += _drain(transitions, agent, timeout=1.0)
+                _check_actors(actors, dead)
+
+            batch = agent.memory.sample(batch_size)
+            td_errors = agent.learn(batch)
+            agent.memory.update_priorities(batch.indices, td_errors)
+
+            if update % publish_every == 0:
+                with version.get_lock():
+                    shared_model.load_state_dict(agent.model.state_dict())
+                    version.value += 1
+    finally:
+        stop.set()
+        # Keep draining so no actor stays blocked on a full queue while exiting
+        while any(actor.is_alive() for actor in actors):
+            _drain(transitions, agent, timeout=0.1)
+            for actor in actors:
+                actor.join(timeout=0.1)
+    return received
@@ -0,0 +1,397 @@
+import argparse
+import time
+
+import numpy as np
+
+from .deepQ_learn import DQNAgent
+
+
+def _rate(fn, seconds):
+    # Call fn repeatedly for roughly `seconds` and return calls per second
+    calls = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        calls += 1
+    return calls / (time.perf_counter() - start)
+
+
+def _latencies(fn, iterations):
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples[i] = time.perf_counter() - start
+    return samples
+
+
+def bench_predict_local(batch_size, seconds):
+    agent = DQNAgent(state_dim=10, action_dim=3)
+    agent.model.eval()
+    agent.epsilon = 0.0
+    states = np.random.rand(batch_size, 10).astype(np.float32)
+
+    single = _rate(lambda: [agent.act(s) for s in states], seconds) * batch_size
+    batched = _rate(lambda: agent.act_batch(states), seconds) * batch_size
+    return single, batched
+
+
+def bench_predict_http(url, batch_size, seconds):
+    import requests
+
+    session = requests.Session()
+    states = np.random.rand(batch_size, 10).astype(np.float32).tolist()
+
+    single = _rate(lambda: session.post(f"{url}/predict", json={"state": states[0]}).raise_for_status(), seconds)
+    batched = _rate(lambda: session.post(f"{url}/predict_batch", json={"states": states}).raise_for_status(), seconds)
+    return single, batched * batch_size
+
+
+def run_predict(args):
+    if args.url:
+        single, batched = bench_predict_http(args.url, args.batch_size, args.seconds)
+    else:
+        single, batched = bench_predict_local(args.batch_size, args.seconds)
+
+    print(f"single  /predict       : {single:12.1f} states/sec")
+    print(f"batched /predict_batch : {batched:12.1f} states/sec (batch={args.batch_size})")
+    print(f"speedup                : {batched / single:12.1f}x")
+
+
+def run_export(args):
+    # Compares eager, TorchScript and int8 variants exported by rl_agent.export
+    import torch
+    from .export import MODEL_FORMATS, export_models, load_model
+    from .offline_dataset import TransitionDataset
+
+    torch.set_num_threads(args.threads)
+    export_models(args.model)
+    models = {fmt: load_model(args.model, fmt) for fmt in MODEL_FORMATS}
+
+    if args.data:
+        states = TransitionDataset(args.data).sample(args.held_out).states
+    else:
+        states = np.random.rand(args.held_out, 10).astype(np.float32)
+    held_out = torch.from_numpy(states)
+    single = held_out[:1]
+    batch = held_out[:args.batch_size]
+
+    with torch.inference_mode():
+        reference = models["eager"](held_out)
+        print(f"{'format':12s} {'p50 us':>9s} {'p99 us':>9s} {'states/sec':>12s} {'agree':>8s} {'max |dQ|':>9s}")
+        for fmt, model in models.items():
+            for _ in range(100):
+                model(single)
+            latency = _latencies(lambda: model(single), args.iterations) * 1e6
+            throughput = _rate(lambda: model(batch), args.seconds) * len(batch)
+            q_values = model(held_out)
+            agree = (q_values.argmax(1) == reference.argmax(1)).float().mean().item()
+            drift = (q_values - reference).abs().max().item()
+            print(f"{fmt:12s} {np.percentile(latency, 50):9.1f} {np.percentile(latency, 99):9.1f} "
+                  f"{throughput:12.1f} {agree:8.2%} {drift:9.4f}")
+
+
+def run_coalesce(args):
+    # Load test: many threads issuing single-state requests, served either
+    # directly (one forward pass each) or through the MicroBatcher
+    import threading
+    from .coalescer import MicroBatcher
+
+    agent = DQNAgent(state_dim=10, action_dim=3)
+    agent.model.eval()
+    agent.epsilon = 0.0
+    state = np.random.rand(10).astype(np.float32)
+
+    def load(predict):
+        latencies = [[] for _ in range(args.concurrency)]
+        deadline = time.perf_counter() + args.seconds
+
+        def worker(samples):
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                predict(state)
+                samples.append(time.perf_counter() - start)
+
+        threads = [threading.Thread(target=worker, args=(samples,)) for samples in latencies]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        samples = np.concatenate([np.asarray(s) for s in latencies]) * 1e3
+        return len(samples) / args.seconds, np.percentile(samples, 50), np.percentile(samples, 99)
+
+    batcher = MicroBatcher(agent, max_batch=args.max_batch, max_latency_ms=args.max_latency_ms)
+    results = {"direct": load(agent.act), "coalesced": load(batcher.predict)}
+    batcher.close()
+
+    print(f"concurrency={args.concurrency} max_batch={args.max_batch} max_latency={args.max_latency_ms}ms")
+    print(f"{'mode':10s} {'req/sec':>10s} {'p50 ms':>8s} {'p99 ms':>8s}")
+    for mode, (rps, p50, p99) in results.items():
+        print(f"{mode:10s} {rps:10.1f} {p50:8.2f} {p99:8.2f}")
+
+
+def run_simulate(args):
+    # Raw simulator throughput plus an end-to-end act/store/learn loop, no Mongo needed
+    from .simulator import TraceEnv, TraceVecEnv
+
+    if args.traces:
+        traces = np.load(args.traces)
+    else:
+        traces = np.random.rand(args.days, 25, 10).astype(np.float32)
+
+    env = TraceEnv(traces, seed=0)
+    env.reset()
+
+    def single_step():
+        if env.step(1)[2]:
+            env.reset()
+
+    vec_env = TraceVecEnv(traces, args.num_envs, seed=0)
+    vec_env.reset()
+    actions = np.random.randint(3, size=args.num_envs)
+
+    agent = DQNAgent(state_dim=traces.shape[2], action_dim=3, memory_size=args.memory_size)
+    states = vec_env.reset()
+
+    def train_step():
+        nonlocal states
+        step_actions = agent.act_batch(states, explore=True)
+        next_states, rewards, dones, infos = vec_env.step(step_actions)
+        agent.memory.add_batch(states, step_actions, rewards, next_states, dones)
+        states = next_states
+        if len(agent.memory) > args.batch_size:
+            agent.replay(args.batch_size)
+
+    print(f"TraceEnv.step             : {_rate(single_step, args.seconds):14.1f} steps/sec")
+    print(f"TraceVecEnv.step_arrays   : {_rate(lambda: vec_env.step_arrays(actions), args.seconds) * args.num_envs:14.1f} steps/sec (K={args.num_envs})")
+    print(f"act + store + replay loop : {_rate(train_step, args.seconds) * args.num_envs:14.1f} transitions/sec")
+
+
+def _measure(fn, seconds):
+    # Time individual calls for roughly `seconds`; also record the numpy
+    # (tracemalloc) allocation peak of one extra traced call
+    import tracemalloc
+
+    fn()
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples = np.asarray(samples)
+
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "ops_per_sec": len(samples) / samples.sum(),
+        "p50_us": float(np.percentile(samples, 50) * 1e6),
+        "p99_us": float(np.percentile(samples, 99) * 1e6),
+        "peak_alloc_mb": peak / 2 ** 20,
+    }
+
+
+def _suite_act(args):
+    import torch
+
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        agent = DQNAgent(state_dim=10, action_dim=3)
+        agent.epsilon = 0.0
+        state = np.random.rand(10).astype(np.float32)
+        yield "DQNAgent.act", {"threads": threads}, _measure(lambda: agent.act(state), args.seconds)
+        for batch_size in args.batch_sizes:
+            states = np.random.rand(batch_size, 10).astype(np.float32)
+            yield "DQNAgent.act_batch", {"threads": threads, "batch_size": batch_size}, \
+                _measure(lambda: agent.act_batch(states), args.seconds)
+
+
+def _suite_replay(args):
+    import torch
+
+    torch.set_num_threads(args.threads[0])
+    for capacity in args.capacities:
+        for prioritized in (False, True):
+            agent = DQNAgent(state_dim=10, action_dim=3, memory_size=capacity, prioritized_replay=prioritized)
+            n = capacity
+            agent.memory.add_batch(np.random.rand(n, 10).astype(np.float32), np.random.randint(3, size=n),
+                                   np.random.rand(n).astype(np.float32), np.random.rand(n, 10).astype(np.float32),
+                                   np.zeros(n, dtype=np.float32))
+            for batch_size in args.batch_sizes:
+                params = {"capacity": capacity, "prioritized": prioritized, "batch_size": batch_size}
+                yield "DQNAgent.replay", params, _measure(lambda: agent.replay(batch_size), args.seconds)
+
+
+def _suite_env(args):
+    # Needs a local mongod: FeatureStore's $facet aggregation is timed against the real server
+    import pymongo
+    from datetime import datetime
+    from .environment import MongoDBEnv
+
+    client = pymongo.MongoClient(args.mongo_uri, serverSelectionTimeoutMS=2000)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError as e:
+        print(f"Skipping MongoDBEnv.step: no MongoDB at {args.mongo_uri} ({e})")
+        return
+    db_name = "rl_agent_benchmark"
+    client.drop_database(db_name)
+    db = client[db_name]
+    now = datetime.now()
+    user_ids = db["users"].insert_many([{"last_login": now, "subscription_plan": "Premium", "feedback_score": 4.0}
+                                        for _ in range(max(args.env_docs // 10, 1))]).inserted_ids
+    db["communications"].insert_many([{"user_id": user_ids[i % len(user_ids)], "timestamp": now,
+                                       "type": "translation", "ai_confidence_score": 90.0, "corrections_made": 1,
+                                       "suggestions_generated": 2, "suggestions_used": 1,
+                                       "offline_mode_used": False, "status": "completed"}
+                                      for i in range(args.env_docs)])
+    try:
+        env = MongoDBEnv(args.mongo_uri, db_name)
+        env.reset()
+        yield "MongoDBEnv.step", {"cache": "hit", "docs": args.env_docs}, _measure(lambda: env.step(1), args.seconds)
+
+        def uncached_step():
+            env.feature_store.invalidate()
+            env.step(1)
+        yield "MongoDBEnv.step", {"cache": "miss", "docs": args.env_docs}, _measure(uncached_step, args.seconds)
+    finally:
+        client.drop_database(db_name)
+
+
+def _suite_predict(args):
+    # Imports the real Flask app against a throwaway checkpoint; MongoClient
+    # connects lazily, so no database is needed for /predict
+    import importlib
+    import os
+    import tempfile
+    import torch
+
+    model_path = os.path.join(tempfile.mkdtemp(), "dqn_model.pth")
+    torch.save(DQNAgent(state_dim=10, action_dim=3).model.state_dict(), model_path)
+    os.environ["DQN_MODEL_PATH"] = model_path
+    os.environ.setdefault("MONGODB_URI", args.mongo_uri)
+    os.environ.setdefault("MONGODB_DB", "rl_agent_benchmark")
+    integration = importlib.import_module(f"{__package__}.integration")
+    # Greedy, so every /predict runs the forward pass instead of random.randrange;
+    # this also loads the model before timing starts
+    integration.get_agent().epsilon = 0.0
+    client = integration.app.test_client()
+
+    state = np.random.rand(10).tolist()
+    yield "/predict", {}, _measure(lambda: client.post("/predict", json={"state": state}), args.seconds)
+    for batch_size in args.batch_sizes:
+        states = np.random.rand(batch_size, 10).tolist()
+        yield "/predict_batch", {"batch_size": batch_size}, \
+            _measure(lambda: client.post("/predict_batch", json={"states": states}), args.seconds)
+
+
+def _compare(results, baseline_path, threshold):
+    import json
+
+    with open(baseline_path) as f:
+        baseline = {(r["name"], json.dumps(r["params"], sort_keys=True)): r for r in json.load(f)["results"]}
+    print(f"\nCompared with {baseline_path} (regression = >{threshold:.0%} slower p50)")
+    regressions = 0
+    for r in results:
+        old = baseline.get((r["name"], json.dumps(r["params"], sort_keys=True)))
+        if old is None:
+            continue
+        ratio = r["p50_us"] / old["p50_us"]
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        regressions += bool(flag)
+        print(f"{r['name']:20s} {json.dumps(r['params']):60s} {ratio:6.2f}x {flag}")
+    return regressions
+
+
+def run_suite(args):
+    # Sweeps the hot paths and writes a JSON report that can be diffed across commits
+    import json
+    import platform
+    import resource
+    import subprocess
+    import torch
+
+    groups = {"act": _suite_act, "replay": _suite_replay, "env": _suite_env, "predict": _suite_predict}
+    results = []
+    for group in args.only or groups:
+        for name, params, metrics in groups[group](args):
+            results.append({"name": name, "params": params, **metrics})
+            print(f"{name:20s} {json.dumps(params):60s} {metrics['ops_per_sec']:12.1f}/s "
+                  f"p50 {metrics['p50_us']:9.1f}us p99 {metrics['p99_us']:9.1f}us "
+                  f"peak {metrics['peak_alloc_mb']:8.2f}MB")
+
+    commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True).stdout.strip()
+    report = {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "results": results,
+    }
+    out = args.output or f"benchmark-{commit[:8] or 'local'}.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {out}")
+
+    if args.compare and _compare(results, args.compare, args.threshold):
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rl_agent performance benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    predict = sub.add_parser("predict", help="Compare single vs batched DQN scoring throughput")
+    predict.add_argument("--batch-size", type=int, default=1024)
+    predict.add_argument("--seconds", type=float, default=3.0)
+    predict.add_argument("--url", help="Benchmark a running server (e.g. http://localhost:5004) instead of the agent in-process")
+    predict.set_defaults(func=run_predict)
+
+    export = sub.add_parser("export", help="Latency, throughput and accuracy drift of eager vs TorchScript vs int8")
+    export.add_argument("--model", default="dqn_model.pth")
+    export.add_argument("--data", help="Offline dataset to draw held-out states from (default: uniform random states)")
+    export.add_argument("--held-out", type=int, default=10000)
+    export.add_argument("--batch-size", type=int, default=256)
+    export.add_argument("--iterations", type=int, default=5000)
+    export.add_argument("--seconds", type=float, default=3.0)
+    export.add_argument("--threads", type=int, default=1)
+    export.set_defaults(func=run_export)
+
+    coalesce = sub.add_parser("coalesce", help="Concurrent /predict load with and without micro-batching")
+    coalesce.add_argument("--concurrency", type=int, default=64)
+    coalesce.add_argument("--max-batch", type=int, default=64)
+    coalesce.add_argument("--max-latency-ms", type=float, default=2.0)
+    coalesce.add_argument("--seconds", type=float, default=5.0)
+    coalesce.set_defaults(func=run_coalesce)
+
+    simulate = sub.add_parser("simulate", help="Simulator and training-loop throughput without MongoDB")
+    simulate.add_argument("--traces", help=".npy file of (days, steps, 10) traces (default: random)")
+    simulate.add_argument("--days", type=int, default=365)
+    simulate.add_argument("--num-envs", type=int, default=1024)
+    simulate.add_argument("--memory-size", type=int, default=1000000)
+    simulate.add_argument("--batch-size", type=int, default=256)
+    simulate.add_argument("--seconds", type=float, default=3.0)
+    simulate.set_defaults(func=run_simulate)
+
+    suite = sub.add_parser("suite", help="Full sweep of act/replay/env/predict, saved as JSON")
+    suite.add_argument("--only", nargs="+", choices=["act", "replay", "env", "predict"])
+    suite.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    suite.add_argument("--batch-sizes", type=int, nargs="+", default=[32, 256, 1024])
+    suite.add_argument("--capacities", type=int, nargs="+", default=[10000, 1000000])
+    suite.add_argument("--mongo-uri", default="mongodb://localhost:27017")
+    suite.add_argument("--env-docs", type=int, default=10000)
+    suite.add_argument("--seconds", type=float, default=1.0)
+    suite.add_argument("--output", help="JSON report path (default: benchmark-<commit>.json)")
+    suite.add_argument("--compare", help="Earlier JSON report; exit 1 if any case regressed")
+    suite.add_argument("--threshold", type=float, default=0.10)
+    suite.set_defaults(func=run_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+import os
+import shutil
+
+import numpy as np
+import torch
+
+# Layout of a checkpoint directory:
+#   <dir>/latest                 name of the newest complete checkpoint
+#   <dir>/ckpt-000001000/state.pt model, optimizer, epsilon, counters, buffer metadata
+#   <dir>/ckpt-000001000/*.npy    replay buffer arrays (raw .npy, no pickle)
+# A checkpoint is written into ckpt-*.tmp and renamed into place only after
+# every file is fsynced, so a crash mid-save never corrupts `latest`.
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def save_checkpoint(agent, directory, step, keep=3, **extra):
+    os.makedirs(directory, exist_ok=True)
+    name = f"ckpt-{step:09d}"
+    final_dir = os.path.join(directory, name)
+    tmp_dir = final_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    memory_meta, arrays = agent.memory.snapshot()
+    for array_name, array in arrays.items():
+        with open(os.path.join(tmp_dir, f"{array_name}.npy"), "wb") as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+
+    with open(os.path.join(tmp_dir, "state.pt"), "wb") as f:
+        torch.save({
+            "model": agent.model.state_dict(),
+            "optimizer": agent.optimizer.state_dict(),
+            "epsilon": agent.epsilon,
+            "step": step,
+            "memory": memory_meta,
+            "extra": extra,
+        }, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.rename(tmp_dir, final_dir)
+    latest_tmp = os.path.join(directory, "latest.tmp")
+    with open(latest_tmp, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(latest_tmp, os.path.join(directory, "latest"))
+    _fsync_path(directory)
+
+    # Drop all but the newest `keep` checkpoints
+    checkpoints = sorted(d for d in os.listdir(directory) if d.startswith("ckpt-") and not d.endswith(".tmp"))
+    for old in checkpoints[:-keep]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return final_dir
+
+
+def load_checkpoint(agent, directory):
+    # Restores agent in place and returns (step, extra), or None if there is
+    # nothing to resume from. Buffer arrays are memory-mapped and copied
+    # straight into the preallocated ReplayBuffer.
+    latest = os.path.join(directory, "latest")
+    if not os.path.exists(latest):
+        return None
+    with open(latest) as f:
+        checkpoint_dir = os.path.join(directory, f.read().strip())
+
+    state = torch.load(os.path.join(checkpoint_dir, "state.pt"))
+    agent.model.load_state_dict(state["model"])
+    agent.optimizer.load_state_dict(state["optimizer"])
+    agent.epsilon = state["epsilon"]
+
+    arrays = {}
+    for file_name in os.listdir(checkpoint_dir):
+        if file_name.endswith(".npy"):
+            arrays[file_name[:-4]] = np.load(os.path.join(checkpoint_dir, file_name), mmap_mode="r")
+    agent.memory.restore(state["memory"], arrays)
+    return state["step"], state["extra"]
@@ -0,0 +1,79 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class MicroBatcher:
+    # Coalesces concurrent single-state requests into one act_batch call.
+    # A background thread waits for the first request, then keeps collecting
+    # until either max_batch states are queued or max_latency_ms has passed
+    # since that first request, runs one forward pass and fans results out.
+    def __init__(self, agent, max_batch=64, max_latency_ms=2.0, explore=False):
+        self.agent = agent
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000
+        self.explore = explore
+        self._requests = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="dqn-micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, state):
+        # Malformed states fail on their own future here, so they can never
+        # break np.stack for the rest of a batch
+        future = Future()
+        try:
+            state = np.asarray(state, dtype=np.float32)
+        except (TypeError, ValueError) as e:
+            future.set_exception(ValueError(f"state is not numeric: {e}"))
+            return future
+        if state.shape != (self.agent.state_dim,):
+            future.set_exception(ValueError(f"state must have shape ({self.agent.state_dim},), got {state.shape}"))
+            return future
+        self._requests.put((state, future))
+        return future
+
+    def predict(self, state, timeout=None):
+        return int(self.submit(state).result(timeout))
+
+    def close(self):
+        self._requests.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        first = self._requests.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Finish this batch, then stop on the next _collect
+                self._requests.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            futures = [future for _, future in batch]
+            try:
+                actions = self.agent.act_batch(np.stack([state for state, _ in batch]), explore=self.explore)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, action in zip(futures, actions):
+                future.set_result(int(action))
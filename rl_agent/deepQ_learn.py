@@ -2,8 +2,8 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 import numpy as np
-from collections import deque
 import random
+from .replay_buffer import ReplayBuffer
 
 class DQN(nn.Module):
     def __init__(self, input_dim, output_dim):
@@ -18,7 +18,7 @@ class DQN(nn.Module):
         return self.fc3(x)
 
 class DQNAgent:
-    def __init__(self, state_dim, action_dim, gamma=0.99, epsilon=1.0, epsilon_min=0.01, epsilon_decay=0.995, lr=0.001):
+    def __init__(self, state_dim, action_dim, gamma=0.99, epsilon=1.0, epsilon_min=0.01, epsilon_decay=0.995, lr=0.001, memory_size=10000, prioritized_replay=False):
         self.state_dim = state_dim
         self.action_dim = action_dim
         self.gamma = gamma
@@ -29,36 +29,62 @@ class DQNAgent:
         
         self.model = DQN(state_dim, action_dim)
         self.optimizer = optim.Adam(self.model.parameters(), lr=lr)
-        self.memory = deque(maxlen=10000)
+        self.memory = ReplayBuffer(memory_size, state_dim, prioritized=prioritized_replay)
     
     def remember(self, state, action, reward, next_state, done):
-        self.memory.append((state, action, reward, next_state, done))
+        self.memory.add(state, action, reward, next_state, done)
     
     def act(self, state):
         if np.random.rand() <= self.epsilon:
             return random.randrange(self.action_dim)
-        state = torch.FloatTensor(state)
+        # Always feed a (1, state_dim) batch; exported TorchScript models are traced on 2-D input
+        state = torch.FloatTensor(state).reshape(1, -1)
         act_values = self.model(state)
         return torch.argmax(act_values).item()
     
+    def act_batch(self, states, explore=False, epsilon=None):
+        # Score an N x state_dim matrix with a single forward pass.
+        # explore=False is purely greedy; explore=True applies epsilon (the
+        # agent's own unless given) per row.
+        states = torch.as_tensor(np.asarray(states, dtype=np.float32))
+        if states.dim() == 1:
+            states = states.unsqueeze(0)
+        with torch.inference_mode():
+            actions = self.model(states).argmax(dim=1).numpy()
+        if explore:
+            epsilon = self.epsilon if epsilon is None else epsilon
+            random_rows = np.random.rand(len(actions)) < epsilon
+            actions[random_rows] = np.random.randint(self.action_dim, size=int(random_rows.sum()))
+        return actions
+    
     def replay(self, batch_size):
         if len(self.memory) < batch_size:
             return
-        minibatch = random.sample(self.memory, batch_size)
-        states = torch.FloatTensor(np.array([i[0] for i in minibatch]))
-        actions = torch.LongTensor(np.array([i[1] for i in minibatch]))
-        rewards = torch.FloatTensor(np.array([i[2] for i in minibatch]))
-        next_states = torch.FloatTensor(np.array([i[3] for i in minibatch]))
-        dones = torch.FloatTensor(np.array([i[4] for i in minibatch]))
+        batch = self.memory.sample(batch_size)
+        td_errors = self.learn(batch)
+        self.memory.update_priorities(batch.indices, td_errors)
         
-        current_q = self.model(states).gather(1, actions.unsqueeze(1))
+        if self.epsilon > self.epsilon_min:
+            self.epsilon *= self.epsilon_decay
+    
+    def learn(self, batch):
+        # One gradient step on a replay_buffer.Batch of NumPy arrays; returns the TD errors
+        states = torch.from_numpy(batch.states)
+        actions = torch.from_numpy(batch.actions)
+        rewards = torch.from_numpy(batch.rewards)
+        next_states = torch.from_numpy(batch.next_states)
+        dones = torch.from_numpy(batch.dones)
+        weights = torch.from_numpy(batch.weights)
+        
+        current_q = self.model(states).gather(1, actions.unsqueeze(1)).squeeze(1)
         next_q = self.model(next_states).detach().max(1)[0]
         target_q = rewards + (1 - dones) * self.gamma * next_q
         
-        loss = nn.MSELoss()(current_q.squeeze(), target_q)
+        # Importance-sampling weights are all ones unless prioritized replay is on
+        td_errors = target_q - current_q
+        loss = (weights * td_errors.pow(2)).mean()
         self.optimizer.zero_grad()
         loss.backward()
         self.optimizer.step()
         
-        if self.epsilon > self.epsilon_min:
-            self.epsilon *= self.epsilon_decay
\ No newline at end of file
+        return td_errors.detach().numpy()
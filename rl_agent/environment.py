@@ -2,15 +2,18 @@ import gym
 from gym import spaces
 import numpy as np
 import pymongo
-from datetime import datetime, timedelta
+from datetime import datetime
+from .feature_store import FeatureStore
 
 class MongoDBEnv(gym.Env):
-    def __init__(self, db_uri, db_name):
+    def __init__(self, db_uri, db_name, feature_store=None, cache_seconds=60):
         super(MongoDBEnv, self).__init__()
         self.client = pymongo.MongoClient(db_uri)
         self.db = self.client[db_name]
         self.users_collection = self.db["users"]
         self.communications_collection = self.db["communications"]
+        # Several envs (e.g. inside a VecEnv) can share one store and its cache
+        self.feature_store = feature_store or FeatureStore(self.db, bucket_seconds=cache_seconds)
         
         # Define action and observation space
         self.action_space = spaces.Discrete(3)  # Example: 3 possible actions
@@ -29,18 +32,8 @@ class MongoDBEnv(gym.Env):
         return next_state, reward, done, {}
     
     def _get_current_state(self):
-        # Fetch current state from MongoDB
-        today = datetime.now()
-        start_of_day = today.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_of_day = start_of_day + timedelta(days=1)
-        
-        # Example: Fetch some metrics from the database
-        user_count = self.users_collection.count_documents({"last_login": {"$gte": start_of_day, "$lt": end_of_day}})
-        comm_count = self.communications_collection.count_documents({"timestamp": {"$gte": start_of_day, "$lt": end_of_day}})
-        
-        # Normalize the state (example)
-        state = np.array([user_count / 1000, comm_count / 500, 0, 0, 0, 0, 0, 0, 0, 0], dtype=np.float32)
-        return state
+        # Fetch current state from the cached feature store (see feature_store.py)
+        return self.feature_store.get_state()
     
     def _take_action(self, action):
         # Perform the action and calculate the reward
@@ -0,0 +1,76 @@
+import argparse
+import os
+
+import torch
+import torch.nn as nn
+
+from .deepQ_learn import DQN
+
+MODEL_FORMATS = ("eager", "torchscript", "quantized")
+
+# Suffix appended to the eager checkpoint name for each exported variant
+_SUFFIXES = {"eager": "", "torchscript": ".ts", "quantized": ".int8"}
+
+
+def exported_path(model_path, fmt):
+    root, ext = os.path.splitext(model_path)
+    return f"{root}{_SUFFIXES[fmt]}{ext}"
+
+
+def load_eager(model_path, state_dim=10, action_dim=3):
+    # mmap=True maps the checkpoint instead of reading it into private memory,
+    # and assign=True makes the parameters those mapped tensors rather than
+    # copying them, so workers loading the same file share its pages
+    model = DQN(state_dim, action_dim)
+    state_dict = torch.load(model_path, mmap=True, weights_only=True)
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
+    return model
+
+
+def load_model(model_path, fmt="eager", state_dim=10, action_dim=3):
+    # model_path is always the eager checkpoint; exported variants sit next to it
+    if fmt not in MODEL_FORMATS:
+        raise ValueError(f"Unknown model format {fmt!r}, expected one of {MODEL_FORMATS}")
+    if fmt == "eager":
+        return load_eager(model_path, state_dim, action_dim)
+    model = torch.jit.load(exported_path(model_path, fmt))
+    model.eval()
+    return model
+
+
+def _trace(model, state_dim, freeze):
+    example = torch.rand(1, state_dim)
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example)
+    # Freezing inlines the float weights as constants; quantized packed params
+    # are left as they are
+    return torch.jit.freeze(traced) if freeze else traced
+
+
+def export_models(model_path, state_dim=10, action_dim=3):
+    # Produces <name>.ts.pth (traced + frozen float32) and <name>.int8.pth
+    # (dynamic int8 quantization of every Linear layer, then traced).
+    model = load_eager(model_path, state_dim, action_dim)
+    quantized = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+    paths = {}
+    for fmt, variant in (("torchscript", model), ("quantized", quantized)):
+        path = exported_path(model_path, fmt)
+        tmp_path = path + ".tmp"
+        torch.jit.save(_trace(variant, state_dim, freeze=fmt == "torchscript"), tmp_path)
+        os.replace(tmp_path, path)
+        paths[fmt] = path
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export TorchScript and int8 variants of a DQN checkpoint")
+    parser.add_argument("--model", default="dqn_model.pth")
+    args = parser.parse_args()
+    for fmt, path in export_models(args.model).items():
+        print(f"{fmt:12s} -> {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+STATE_DIM = 10
+
+# Running sums kept for today's communications. Documents older than the
+# settled boundary are summed once and kept; the trailing overlap window after
+# it is re-aggregated in full on every refresh, so documents that share a
+# timestamp with an earlier refresh or arrive up to overlap_seconds late are
+# still counted exactly once.
+COMM_FIELDS = ("count", "voice", "confidence", "corrections", "suggestions_generated",
+               "suggestions_used", "offline", "completed")
+USER_FIELDS = ("count", "premium", "feedback")
+
+
+def _ratio(num, den):
+    return num / den if den else 0.0
+
+
+def _count_if(expr):
+    return {"$sum": {"$cond": [expr, 1, 0]}}
+
+
+def add_communication(totals, doc):
+    # Python twin of the communications $group below, for streaming exports
+    totals["count"] += 1
+    totals["voice"] += doc.get("type") == "voice-to-text"
+    totals["confidence"] += doc.get("ai_confidence_score") or 0
+    totals["corrections"] += doc.get("corrections_made") or 0
+    totals["suggestions_generated"] += doc.get("suggestions_generated") or 0
+    totals["suggestions_used"] += doc.get("suggestions_used") or 0
+    totals["offline"] += doc.get("offline_mode_used") is True
+    totals["completed"] += doc.get("status") == "completed"
+
+
+def add_user(totals, doc):
+    # One active user: someone with at least one communication today. Plan and
+    # feedback are read from the users document, which may be missing ({}).
+    totals["count"] += 1
+    totals["premium"] += doc.get("subscription_plan") == "Premium"
+    totals["feedback"] += doc.get("feedback_score") or 0
+
+
+def state_from_totals(c, u):
+    state = np.array([
+        u["count"] / 1000,
+        c["count"] / 500,
+        _ratio(u["premium"], u["count"]),
+        _ratio(u["feedback"], u["count"]) / 5,
+        _ratio(c["voice"], c["count"]),
+        _ratio(c["confidence"], c["count"]) / 100,
+        _ratio(c["corrections"], c["count"]) / 3,
+        _ratio(c["suggestions_used"], c["suggestions_generated"]),
+        _ratio(c["offline"], c["count"]),
+        _ratio(c["completed"], c["count"]),
+    ], dtype=np.float32)
+    # Counts (slots 0-1) keep their original scaling; ratios stay in [0, 1]
+    state[2:] = np.clip(state[2:], 0, 1)
+    return state
+
+
+def load_users(collection, ids):
+    # Plan and feedback for the given user ids, fetched in one $in query;
+    # ids with no users document map to {}
+    if not ids:
+        return {}
+    cursor = collection.find({"_id": {"$in": list(ids)}}, {"subscription_plan": 1, "feedback_score": 1})
+    found = {doc["_id"]: doc for doc in cursor}
+    return {user_id: found.get(user_id, {}) for user_id in ids}
+
+
+class FeatureStore:
+    # Serves the 10-feature daily state vector for MongoDBEnv. The vector is
+    # computed by one communications aggregation plus a lookup of users not yet
+    # seen today, and cached per time bucket, so env steps inside a bucket
+    # never touch the database.
+    #
+    # Active users are the distinct communications.user_id values of the day.
+    # users.last_login is overwritten in place, so it can't be replayed for
+    # past days, and offline_dataset must build the same features from history.
+    #
+    # State layout:
+    #   0 active users today / 1000     5 mean ai_confidence_score / 100
+    #   1 communications today / 500    6 mean corrections_made / 3
+    #   2 premium share of active users 7 suggestions used / generated
+    #   3 mean feedback_score / 5       8 offline-mode share of communications
+    #   4 voice-to-text share           9 completed share of communications
+    def __init__(self, db, bucket_seconds=60, clock=datetime.now, overlap_seconds=300):
+        self.users_collection = db["users"]
+        self.communications_collection = db["communications"]
+        self.bucket_seconds = bucket_seconds
+        self.clock = clock
+        self.overlap = timedelta(seconds=overlap_seconds)
+
+        self._lock = threading.Lock()
+        self._bucket = None
+        self._day = None
+        self._settled = None
+        self._settled_totals = dict.fromkeys(COMM_FIELDS, 0.0)
+        self._comm_totals = dict.fromkeys(COMM_FIELDS, 0.0)
+        self._user_docs = {}
+        self._settled_users = set()
+        self._settled_user_totals = dict.fromkeys(USER_FIELDS, 0.0)
+        self._user_totals = dict.fromkeys(USER_FIELDS, 0.0)
+        self._state = np.zeros(STATE_DIM, dtype=np.float32)
+
+    def get_state(self):
+        now = self.clock()
+        bucket = int(now.timestamp() // self.bucket_seconds)
+        with self._lock:
+            if bucket != self._bucket:
+                self._refresh(now)
+                self._bucket = bucket
+            return self._state.copy()
+
+    def invalidate(self):
+        with self._lock:
+            self._bucket = None
+
+    def _refresh(self, now):
+        start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        end_of_day = start_of_day + timedelta(days=1)
+        if start_of_day != self._day:
+            # New day: drop yesterday's running sums and rescan from midnight
+            self._day = start_of_day
+            self._settled = start_of_day
+            self._settled_totals = dict.fromkeys(COMM_FIELDS, 0.0)
+            self._user_docs = {}
+            self._settled_users = set()
+            self._settled_user_totals = dict.fromkeys(USER_FIELDS, 0.0)
+
+        # Everything before `boundary` is assumed final after this refresh
+        boundary = min(max(self._settled, now - self.overlap), end_of_day)
+        pipeline = self._pipeline(boundary, end_of_day)
+        result = next(self.communications_collection.aggregate(pipeline), {})
+        self._merge(result)
+        self._settled = boundary
+        self._state = state_from_totals(self._comm_totals, self._user_totals)
+
+    def _pipeline(self, boundary, end_of_day):
+        comm_group = {"$group": {
+            "_id": None,
+            "count": {"$sum": 1},
+            "voice": _count_if({"$eq": ["$type", "voice-to-text"]}),
+            "confidence": {"$sum": "$ai_confidence_score"},
+            "corrections": {"$sum": "$corrections_made"},
+            "suggestions_generated": {"$sum": "$suggestions_generated"},
+            "suggestions_used": {"$sum": "$suggestions_used"},
+            "offline": _count_if({"$eq": ["$offline_mode_used", True]}),
+            "completed": _count_if({"$eq": ["$status", "completed"]}),
+            "user_ids": {"$addToSet": "$user_id"},
+        }}
+
+        return [
+            {"$match": {"timestamp": {"$gte": self._settled, "$lt": end_of_day}}},
+            {"$facet": {
+                # Newly settled documents, added to the kept sums once
+                "settled": [{"$match": {"timestamp": {"$lt": boundary}}}, comm_group],
+                # The overlap window, recomputed from scratch every refresh
+                "tail": [{"$match": {"timestamp": {"$gte": boundary}}}, comm_group],
+            }},
+        ]
+
+    def _merge(self, result):
+        settled = (result.get("settled") or [{}])[0]
+        tail = (result.get("tail") or [{}])[0]
+        for field in COMM_FIELDS:
+            self._settled_totals[field] += settled.get(field, 0) or 0
+            self._comm_totals[field] = self._settled_totals[field] + (tail.get(field, 0) or 0)
+
+        settled_users = set(settled.get("user_ids") or ()) - self._settled_users
+        tail_users = set(tail.get("user_ids") or ()) - self._settled_users - settled_users
+        self._user_docs.update(load_users(self.users_collection,
+                                          (settled_users | tail_users) - self._user_docs.keys()))
+        for user_id in settled_users:
+            add_user(self._settled_user_totals, self._user_docs[user_id])
+        self._settled_users |= settled_users
+        self._user_totals = dict(self._settled_user_totals)
+        for user_id in tail_users:
+            add_user(self._user_totals, self._user_docs[user_id])
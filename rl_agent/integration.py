@@ -1,40 +1,23 @@
-from flask import Flask, request, jsonify
-import torch
-import gym
-from gym import spaces
-import numpy as np
-import pymongo
-from datetime import datetime, timedelta
 # General Imports
-import random
-from datetime import datetime, timedelta
-from collections import deque
+import os
+import subprocess
+import sys
+import threading
+import time
 
-# MongoDB Imports
-import pymongo
+# NumPy Imports
+import numpy as np
 
 # Flask Imports
 from flask import Flask, request, jsonify
+from flask_cors import CORS
+from dotenv import load_dotenv
 
-# Gym (Reinforcement Learning) Imports
-import gym
-from gym import spaces
+# torch, gym, pymongo and schedule are imported lazily (see get_agent, get_env
+# and start_scheduler) so that a worker can bind and answer /ready quickly.
 
-# NumPy and PyTorch Imports
-import numpy as np
-import torch
-import torch.nn as nn
-import torch.optim as optim
-# Scheduling Imports (for daily updates)
-import schedule
-import time
-from flask_cors import CORS
-from .deepQ_learn import DQNAgent
 app = Flask(__name__)
 CORS(app)
-import os
-from dotenv import load_dotenv
-from .environment import MongoDBEnv  # Adjust this import based on your actual module
 
 # Load environment variables from .env file
 load_dotenv()
@@ -43,37 +26,245 @@ load_dotenv()
 mongo_uri = os.getenv("MONGODB_URI")
 database_name = os.getenv("MONGODB_DB")
 
-# Initialize MongoDB environment
-env = MongoDBEnv(mongo_uri, database_name)
+# Model configuration
+MODEL_PATH = os.getenv("DQN_MODEL_PATH", "dqn_model.pth")
+OFFLINE_DATA_DIR = os.getenv("DQN_OFFLINE_DATA_DIR", "transitions")
+RETRAIN_STEPS = os.getenv("DQN_RETRAIN_STEPS", "20000")
+MODEL_POLL_SECONDS = int(os.getenv("DQN_MODEL_POLL_SECONDS", "30"))
+# eager | torchscript | quantized (variants are produced by rl_agent.export)
+MODEL_FORMAT = os.getenv("DQN_MODEL_FORMAT", "eager")
+# Exploration rate while serving; 0 answers every request greedily
+SERVE_EPSILON = float(os.getenv("DQN_SERVE_EPSILON", "0"))
+
+env = None
+agent = None
+batcher = None
+model_mtime = None
+load_error = None
+loader_thread = None
+loader_pid = None
+poller_pid = None
+init_lock = threading.Lock()
+loader_lock = threading.Lock()
+reload_lock = threading.Lock()
 
-# Initialize the DQN agent
-agent = DQNAgent(state_dim=10, action_dim=3)
+def get_env():
+    # The Mongo client is only created when something actually needs it
+    global env
+    if env is None:
+        with init_lock:
+            if env is None:
+                from .environment import MongoDBEnv
+                env = MongoDBEnv(mongo_uri, database_name)
+    return env
 
-# Load trained model (assuming you have a trained model)
-agent.model.load_state_dict(torch.load("dqn_model.pth"))
-agent.model.eval()
+def get_agent():
+    # Builds the agent and loads the checkpoint on first use. Eager checkpoints
+    # are memory-mapped (see export.load_eager), so workers share the weight
+    # pages through the page cache instead of each holding a private copy.
+    global agent, batcher, model_mtime
+    if agent is None:
+        with init_lock:
+            if agent is None:
+                from .deepQ_learn import DQNAgent
+                from .export import exported_path, load_model
+                loaded = DQNAgent(state_dim=10, action_dim=3)
+                loaded.model = load_model(MODEL_PATH, MODEL_FORMAT)
+                # The constructor's epsilon=1.0 is a training start value and
+                # would make every served action random
+                loaded.epsilon = SERVE_EPSILON
+                model_mtime = os.path.getmtime(exported_path(MODEL_PATH, MODEL_FORMAT))
+
+                # Optional request coalescing for /predict under concurrent load.
+                # Explores only when a serving epsilon is set, like agent.act.
+                if os.getenv("DQN_COALESCE", "0") == "1":
+                    from .coalescer import MicroBatcher
+                    batcher = MicroBatcher(
+                        loaded,
+                        max_batch=int(os.getenv("DQN_COALESCE_MAX_BATCH", "64")),
+                        max_latency_ms=float(os.getenv("DQN_COALESCE_MAX_LATENCY_MS", "2")),
+                        explore=SERVE_EPSILON > 0,
+                    )
+                agent = loaded
+    return agent
+
+def preload():
+    # Call before forking workers (e.g. gunicorn --preload with DQN_PRELOAD=1)
+    # so every worker inherits the loaded model copy-on-write
+    get_agent()
+
+def _background_load():
+    global load_error
+    try:
+        get_agent()
+        load_error = None
+    except Exception as e:
+        load_error = str(e)
+        print(f"Model load failed: {e}")
+
+def start_background_load():
+    # Loads the model on a thread of this process unless it is loaded or
+    # already loading. Threads do not survive fork, so a forked worker
+    # starts its own; a failed load is retried on the next call. Also starts
+    # this process's poller for new weights.
+    global loader_thread, loader_pid
+    start_model_poller()
+    if agent is not None:
+        return
+    # Not init_lock: that is held for the whole load, and /ready must not wait on it
+    with loader_lock:
+        if loader_pid == os.getpid() and loader_thread.is_alive():
+            return
+        loader_thread = threading.Thread(target=_background_load, name="rl-preload", daemon=True)
+        loader_pid = os.getpid()
+        loader_thread.start()
+
+if os.getenv("DQN_PRELOAD", "0") == "1":
+    preload()
+
+@app.before_request
+def _ensure_loading():
+    # Under gunicorn/WSGI nothing else would start the load before the first
+    # /predict, and a load balancer waiting on /ready never sends one
+    start_background_load()
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    # Readiness probe: 200 once the model is loaded, 503 while still starting
+    if agent is None:
+        body = {"ready": False}
+        if load_error:
+            body["error"] = load_error
+        return jsonify(body), 503
+    return jsonify({"ready": True, "model_format": MODEL_FORMAT})
 
 @app.route('/predict', methods=['POST'])
 def predict():
     data = request.json
-    state = np.array(data['state'], dtype=np.float32)
-    action = agent.act(state)
+    agent = get_agent()
+    try:
+        state = np.array(data['state'], dtype=np.float32)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "state must be a list of numbers"}), 400
+    if state.shape != (agent.state_dim,):
+        return jsonify({"error": f"state must be a list of {agent.state_dim} numbers"}), 400
+    action = batcher.predict(state) if batcher else agent.act(state)
     return jsonify({"action": int(action)})
 
-import schedule
-import time
+@app.route('/predict_batch', methods=['POST'])
+def predict_batch():
+    # Score many users at once: {"states": [[...10 floats...], ...], "explore": false}.
+    # explore=true uses "epsilon" from the request, or DQN_SERVE_EPSILON.
+    data = request.get_json(silent=True)
+    agent = get_agent()
+    try:
+        states = np.array(data['states'], dtype=np.float32)
+    except (KeyError, TypeError, ValueError, IndexError):
+        return jsonify({"error": f"states must be an N x {agent.state_dim} matrix of numbers"}), 400
+    if states.ndim != 2 or states.shape[1] != agent.state_dim:
+        return jsonify({"error": f"states must be an N x {agent.state_dim} matrix"}), 400
+    explore = bool(data.get('explore', False))
+    try:
+        epsilon = float(data.get('epsilon', SERVE_EPSILON))
+    except (TypeError, ValueError):
+        epsilon = -1.0
+    if not 0 <= epsilon <= 1:
+        return jsonify({"error": "epsilon must be a number between 0 and 1"}), 400
+    if explore and epsilon == 0:
+        return jsonify({"error": "explore needs an epsilon: pass one or set DQN_SERVE_EPSILON"}), 400
+    actions = agent.act_batch(states, explore=explore, epsilon=epsilon)
+    return jsonify({"actions": actions.tolist()})
+
+def reload_model_if_changed():
+    # Hot-swap weights when the served model file has been replaced. The new network is
+    # built and loaded on the side, then published with a single attribute
+    # assignment, so in-flight /predict calls finish on the old model and
+    # new ones pick up the new one without ever waiting on a lock.
+    from .export import exported_path, load_model
+    global model_mtime
+    if agent is None:
+        return False
+    with reload_lock:
+        served_path = exported_path(MODEL_PATH, MODEL_FORMAT)
+        mtime = os.path.getmtime(served_path)
+        if mtime == model_mtime:
+            return False
+        agent.model = load_model(MODEL_PATH, MODEL_FORMAT)
+        model_mtime = mtime
+        print(f"Reloaded DQN weights from {served_path}")
+        return True
 
 def daily_update():
-    # Fetch new data from MongoDB and update the RL agent
-    state = env.reset()
-    # You can retrain the agent with new data if needed
-    # train_agent(env, agent, episodes=1)
+    # Fetch new data from MongoDB and update the RL agent. Export and training
+    # run in a child process so they never compete with /predict for the GIL;
+    # the new checkpoint is atomically renamed into place (re-exported for
+    # non-eager formats) and hot-loaded. Nothing is scored per user: the
+    # model only knows the aggregate FeatureStore state.
+    try:
+        get_env().reset()
+        offline = f"{__package__}.offline_dataset"
+        subprocess.run([sys.executable, "-m", offline, "export", "--out", OFFLINE_DATA_DIR], check=True)
+        subprocess.run([sys.executable, "-m", offline, "train", "--data", OFFLINE_DATA_DIR,
+                        "--model", MODEL_PATH, "--steps", RETRAIN_STEPS], check=True)
+        if MODEL_FORMAT != "eager":
+            subprocess.run([sys.executable, "-m", f"{__package__}.export", "--model", MODEL_PATH], check=True)
+        reload_model_if_changed()
+    except Exception as e:
+        print(f"Daily update failed: {e}")
+
+def _run_safely(job):
+    # schedule lets job exceptions escape run_pending(), which would end the
+    # thread and with it every later reload or retrain
+    try:
+        job()
+    except Exception as e:
+        print(f"{job.__name__} failed: {e}")
+
+def _poll_model():
+    while True:
+        time.sleep(MODEL_POLL_SECONDS)
+        _run_safely(reload_model_if_changed)
+
+def start_model_poller():
+    # Polls the served model file for new weights on a daemon thread, once per
+    # process (forked workers start their own). DQN_MODEL_POLL_SECONDS=0 disables it.
+    global poller_pid
+    if MODEL_POLL_SECONDS <= 0:
+        return
+    with loader_lock:
+        if poller_pid == os.getpid():
+            return
+        poller_pid = os.getpid()
+        threading.Thread(target=_poll_model, name="rl-model-poll", daemon=True).start()
 
-schedule.every().day.at("00:00").do(daily_update)
+def _run_scheduler():
+    import schedule
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
 
-while True:
-    schedule.run_pending()
-    time.sleep(1)
+def start_scheduler(retrain=True):
+    # Runs the schedule in a daemon thread so it never blocks app.run().
+    # Servers that share a checkpoint with a dedicated retraining worker pass
+    # retrain=False and only poll the served model file for new weights.
+    start_model_poller()
+    if not retrain:
+        return None
+    import schedule
+    schedule.every().day.at("00:00").do(_run_safely, daily_update)
+    thread = threading.Thread(target=_run_scheduler, name="rl-scheduler", daemon=True)
+    thread.start()
+    return thread
 
 if __name__ == '__main__':
-    app.run(port=5004)
\ No newline at end of file
+    if '--worker' in sys.argv:
+        # Dedicated retraining worker: no HTTP serving in this process
+        import schedule
+        schedule.every().day.at("00:00").do(_run_safely, daily_update)
+        _run_scheduler()
+    else:
+        # Bind immediately and load the model in the background; /ready
+        # reports 503 until it is done
+        start_background_load()
+        start_scheduler(retrain='--no-retrain' not in sys.argv)
+        app.run(port=5004)
\ No newline at end of file
@@ -0,0 +1,232 @@
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .feature_store import COMM_FIELDS, STATE_DIM, USER_FIELDS, add_communication, add_user, load_users, state_from_totals
+from .replay_buffer import Batch
+
+# Mirrors MongoDBEnv._take_action: 0 do nothing, 1 send notification, 2 update settings
+ACTION_REWARDS = np.array([0.0, 1.0, 0.5], dtype=np.float32)
+
+# name -> (dtype, has a state_dim axis)
+_ARRAYS = {
+    "states": (np.float32, True),
+    "actions": (np.int64, False),
+    "rewards": (np.float32, False),
+    "next_states": (np.float32, True),
+    "dones": (np.float32, False),
+}
+
+
+class TransitionDataset:
+    # Append-only transition store: one raw binary file per field, read back
+    # through np.memmap so sampling touches only the pages it needs.
+    # meta.json is rewritten atomically after each append and is the source of
+    # truth, so a crash mid-append only loses the unfinished chunk.
+    def __init__(self, path, state_dim=STATE_DIM):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        meta = {"count": 0, "state_dim": state_dim, "watermark": None}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta.update(json.load(f))
+        self.count = meta["count"]
+        self.state_dim = meta["state_dim"]
+        self.watermark = datetime.fromisoformat(meta["watermark"]) if meta["watermark"] else None
+        self._truncate_to_count()
+        self._open_maps()
+
+    @property
+    def _meta_path(self):
+        return os.path.join(self.path, "meta.json")
+
+    def _file(self, name):
+        return os.path.join(self.path, f"{name}.bin")
+
+    def _row_shape(self, name):
+        return (self.state_dim,) if _ARRAYS[name][1] else ()
+
+    def _truncate_to_count(self):
+        # Drop bytes written by an append that never reached meta.json
+        for name, (dtype, _) in _ARRAYS.items():
+            size = self.count * int(np.prod(self._row_shape(name))) * np.dtype(dtype).itemsize
+            if os.path.exists(self._file(name)) and os.path.getsize(self._file(name)) != size:
+                os.truncate(self._file(name), size)
+
+    def _open_maps(self):
+        for name, (dtype, _) in _ARRAYS.items():
+            shape = (self.count,) + self._row_shape(name)
+            if self.count:
+                array = np.memmap(self._file(name), dtype=dtype, mode="r", shape=shape)
+            else:
+                array = np.zeros(shape, dtype=dtype)
+            setattr(self, name, array)
+
+    def __len__(self):
+        return self.count
+
+    def append(self, watermark, **arrays):
+        n = len(arrays["actions"])
+        for name, (dtype, _) in _ARRAYS.items():
+            with open(self._file(name), "ab") as f:
+                f.write(np.ascontiguousarray(arrays[name], dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self.count += n
+        self.watermark = watermark
+        tmp_path = self._meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"count": self.count, "state_dim": self.state_dim, "watermark": watermark.isoformat()}, f)
+        os.replace(tmp_path, self._meta_path)
+        self._open_maps()
+
+    def sample(self, batch_size):
+        # Sorted indices keep memmap reads roughly sequential
+        idx = np.sort(np.random.randint(0, self.count, size=batch_size))
+        return Batch(
+            self.states[idx],
+            self.actions[idx],
+            self.rewards[idx],
+            self.next_states[idx],
+            self.dones[idx],
+            np.ones(batch_size, dtype=np.float32),
+            idx,
+        )
+
+
+class _TimeOrderedStream:
+    # Wraps a cursor sorted on `field` and hands out documents one time bucket at a time
+    def __init__(self, cursor, field):
+        self._it = iter(cursor)
+        self._field = field
+        self._next = next(self._it, None)
+
+    def take_until(self, end):
+        docs = []
+        while self._next is not None and self._next[self._field] < end:
+            docs.append(self._next)
+            self._next = next(self._it, None)
+        return docs
+
+
+def _stream(collection, field, start, end, projection, batch_size):
+    cursor = (collection.find({field: {"$gte": start, "$lt": end}}, projection)
+              .sort(field, 1)
+              .batch_size(batch_size))
+    return _TimeOrderedStream(cursor, field)
+
+
+def export_transitions(db, out_dir, step_minutes=60, until=None, batch_size=1000):
+    # Replays history one day at a time. Within a day the state is the
+    # cumulative FeatureStore vector at the start of each step; the action is
+    # what actually happened during the step (a notification was sent -> 1,
+    # settings were updated -> 2, otherwise 0), rewarded as MongoDBEnv would.
+    # Active users are the distinct communications.user_id values so far that
+    # day, exactly as FeatureStore counts them live.
+    # Only complete days are exported, and the watermark is the next day to
+    # export, so re-running picks up exactly where the last run stopped.
+    dataset = TransitionDataset(out_dir)
+    start = dataset.watermark
+    if start is None:
+        first = db["communications"].find_one({}, {"timestamp": 1}, sort=[("timestamp", 1)])
+        if first is None:
+            return 0
+        start = first["timestamp"].replace(hour=0, minute=0, second=0, microsecond=0)
+    until = (until or datetime.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    if start >= until:
+        return 0
+
+    comm_fields = {"timestamp": 1, "type": 1, "ai_confidence_score": 1, "corrections_made": 1,
+                   "suggestions_generated": 1, "suggestions_used": 1, "offline_mode_used": 1, "status": 1,
+                   "user_id": 1}
+    communications = _stream(db["communications"], "timestamp", start, until, comm_fields, batch_size)
+    notifications = _stream(db["notifications"], "timestamp", start, until, {"timestamp": 1}, batch_size)
+    settings = _stream(db["settings"], "last_updated", start, until, {"last_updated": 1}, batch_size)
+
+    step = timedelta(minutes=step_minutes)
+    steps_per_day = int(timedelta(days=1) / step)
+    exported = 0
+    day = start
+    while day < until:
+        comm_totals = dict.fromkeys(COMM_FIELDS, 0.0)
+        user_totals = dict.fromkeys(USER_FIELDS, 0.0)
+        seen_users = set()
+        states = np.zeros((steps_per_day + 1, STATE_DIM), dtype=np.float32)
+        actions = np.zeros(steps_per_day, dtype=np.int64)
+        for t in range(steps_per_day):
+            step_end = day + (t + 1) * step
+            new_users = set()
+            for doc in communications.take_until(step_end):
+                add_communication(comm_totals, doc)
+                if doc.get("user_id") is not None and doc["user_id"] not in seen_users:
+                    new_users.add(doc["user_id"])
+            for doc in load_users(db["users"], new_users).values():
+                add_user(user_totals, doc)
+            seen_users |= new_users
+            notified = notifications.take_until(step_end)
+            updated = settings.take_until(step_end)
+            actions[t] = 1 if notified else 2 if updated else 0
+            states[t + 1] = state_from_totals(comm_totals, user_totals)
+
+        dones = np.zeros(steps_per_day, dtype=np.float32)
+        dones[-1] = 1.0
+        day += timedelta(days=1)
+        dataset.append(
+            day,
+            states=states[:-1],
+            actions=actions,
+            rewards=ACTION_REWARDS[actions],
+            next_states=states[1:],
+            dones=dones,
+        )
+        exported += steps_per_day
+    return exported
+
+
+def main():
+    import pymongo
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Build or train from an offline transition dataset")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export new complete days from MongoDB")
+    export.add_argument("--out", default="transitions")
+    export.add_argument("--step-minutes", type=int, default=60)
+    train = sub.add_parser("train", help="Train DQNAgent from an exported dataset")
+    train.add_argument("--data", default="transitions")
+    train.add_argument("--steps", type=int, default=100000)
+    train.add_argument("--batch-size", type=int, default=256)
+    train.add_argument("--model", default="dqn_model.pth")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        load_dotenv()
+        db = pymongo.MongoClient(os.getenv("MONGODB_URI"))[os.getenv("MONGODB_DB")]
+        print(f"Exported {export_transitions(db, args.out, step_minutes=args.step_minutes)} transitions")
+    else:
+        dataset = TransitionDataset(args.data)
+        if len(dataset) == 0:
+            # Nothing to sample until the first complete day is exported
+            print(f"No transitions in {args.data} yet; skipping training")
+            return
+
+        import torch
+        from .deepQ_learn import DQNAgent
+        from .training import train_offline
+
+        agent = DQNAgent(state_dim=STATE_DIM, action_dim=len(ACTION_REWARDS))
+        if os.path.exists(args.model):
+            # Fine-tune the current weights rather than starting from scratch
+            agent.model.load_state_dict(torch.load(args.model))
+        train_offline(agent, dataset, steps=args.steps, batch_size=args.batch_size)
+        # Write then rename, so a server polling the file never sees a partial checkpoint
+        tmp_path = args.model + ".tmp"
+        torch.save(agent.model.state_dict(), tmp_path)
+        os.replace(tmp_path, args.model)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+from collections import namedtuple
+
+import numpy as np
+
+Batch = namedtuple("Batch", ["states", "actions", "rewards", "next_states", "dones", "weights", "indices"])
+
+ARRAY_NAMES = ("states", "actions", "rewards", "next_states", "dones")
+
+
+class SumTree:
+    # Binary tree stored in a flat array: leaves hold priorities, every parent
+    # holds the sum of its children, so sampling by priority mass is O(log N).
+    def __init__(self, capacity):
+        self.leaf_start = 1
+        while self.leaf_start < capacity:
+            self.leaf_start *= 2
+        self.depth = int(np.log2(self.leaf_start))
+        self.tree = np.zeros(2 * self.leaf_start, dtype=np.float64)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def get(self, indices):
+        return self.tree[self.leaf_start + np.asarray(indices)]
+
+    def update(self, indices, priorities):
+        nodes = self.leaf_start + np.asarray(indices, dtype=np.int64)
+        self.tree[nodes] = priorities
+        # Recompute parents level by level for all touched leaves at once
+        for _ in range(self.depth):
+            nodes = np.unique(nodes // 2)
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def find(self, values):
+        # Walk all sample values down the tree in lockstep
+        nodes = np.ones(len(values), dtype=np.int64)
+        values = np.array(values, dtype=np.float64)
+        for _ in range(self.depth):
+            left = 2 * nodes
+            left_sum = self.tree[left]
+            go_right = values > left_sum
+            values = np.where(go_right, values - left_sum, values)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.leaf_start
+
+
+class ReplayBuffer:
+    # Fixed-size ring buffer backed by contiguous NumPy arrays. Storage is
+    # allocated once up front, so adding and sampling never allocate per item.
+    def __init__(self, capacity, state_dim, prioritized=False, alpha=0.6, beta=0.4, beta_increment=0.001, priority_eps=1e-6):
+        self.capacity = capacity
+        self.state_dim = state_dim
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.beta_increment = beta_increment
+        self.priority_eps = priority_eps
+
+        self.states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros((capacity, state_dim), dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=np.float32)
+
+        self.pos = 0
+        self.size = 0
+        self.tree = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        i = self.pos
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        if self.prioritized:
+            self.tree.update([i], [self.max_priority ** self.alpha])
+        self.pos = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        n = len(actions)
+        if n > self.capacity:
+            # Only the newest `capacity` transitions would survive anyway
+            states, actions, rewards, next_states, dones = (
+                x[-self.capacity:] for x in (states, actions, rewards, next_states, dones)
+            )
+            n = self.capacity
+        idx = (self.pos + np.arange(n)) % self.capacity
+        self.states[idx] = states
+        self.actions[idx] = actions
+        self.rewards[idx] = rewards
+        self.next_states[idx] = next_states
+        self.dones[idx] = dones
+        if self.prioritized:
+            self.tree.update(idx, np.full(n, self.max_priority ** self.alpha))
+        self.pos = int((self.pos + n) % self.capacity)
+        self.size = min(self.size + n, self.capacity)
+
+    def sample(self, batch_size):
+        if self.prioritized:
+            # Stratified sampling: one draw from each equal slice of priority mass
+            segment = self.tree.total / batch_size
+            values = (np.arange(batch_size) + np.random.rand(batch_size)) * segment
+            idx = np.minimum(self.tree.find(values), self.size - 1)
+            probs = self.tree.get(idx) / self.tree.total
+            weights = (self.size * probs) ** -self.beta
+            weights = (weights / weights.max()).astype(np.float32)
+            self.beta = min(1.0, self.beta + self.beta_increment)
+        else:
+            idx = np.random.randint(0, self.size, size=batch_size)
+            weights = np.ones(batch_size, dtype=np.float32)
+        return Batch(
+            self.states[idx],
+            self.actions[idx],
+            self.rewards[idx],
+            self.next_states[idx],
+            self.dones[idx],
+            weights,
+            idx,
+        )
+
+    def snapshot(self):
+        # Metadata plus views of the filled part of each array, for checkpoint.py
+        meta = {"capacity": self.capacity, "state_dim": self.state_dim, "prioritized": self.prioritized,
+                "pos": self.pos, "size": self.size, "beta": self.beta, "max_priority": self.max_priority}
+        arrays = {name: getattr(self, name)[:self.size] for name in ARRAY_NAMES}
+        if self.prioritized:
+            arrays["tree"] = self.tree.tree
+        return meta, arrays
+
+    def restore(self, meta, arrays):
+        if meta["capacity"] != self.capacity or meta["state_dim"] != self.state_dim:
+            raise ValueError(f"Snapshot is for a {meta['capacity']} x {meta['state_dim']} buffer, "
+                             f"not {self.capacity} x {self.state_dim}")
+        size = meta["size"]
+        for name in ARRAY_NAMES:
+            getattr(self, name)[:size] = arrays[name]
+        self.pos = meta["pos"]
+        self.size = size
+        self.beta = meta["beta"]
+        self.max_priority = meta["max_priority"]
+        if self.prioritized:
+            if "tree" in arrays:
+                self.tree.tree[:] = arrays["tree"]
+            else:
+                self.tree.update(np.arange(size), np.full(size, self.max_priority ** self.alpha))
+
+    def update_priorities(self, indices, td_errors):
+        if not self.prioritized:
+            return
+        priorities = np.abs(td_errors) + self.priority_eps
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self.tree.update(indices, priorities ** self.alpha)
@@ -0,0 +1,102 @@
+import time
+from datetime import datetime, timedelta
+
+import gym
+import numpy as np
+from gym import spaces
+
+from .offline_dataset import ACTION_REWARDS
+
+
+def traces_from_dataset(dataset, steps_per_day=24):
+    # Rebuild per-day state trajectories (days, steps_per_day + 1, state_dim)
+    # from an offline_dataset.TransitionDataset written with the same step size
+    days = len(dataset) // steps_per_day
+    n = days * steps_per_day
+    states = np.asarray(dataset.states[:n]).reshape(days, steps_per_day, -1)
+    last = np.asarray(dataset.next_states[steps_per_day - 1:n:steps_per_day])[:, None, :]
+    return np.concatenate([states, last], axis=1)
+
+
+def record_trace(env, steps, interval_seconds=60):
+    # Sample a live MongoDBEnv's state every interval_seconds (one day = 1440
+    # steps at the default interval) and return a (1, steps, state_dim) trace
+    states = [env.reset()]
+    for _ in range(steps - 1):
+        time.sleep(interval_seconds)
+        states.append(env._get_current_state())
+    return np.stack(states)[None]
+
+
+class TraceEnv(gym.Env):
+    # Drop-in replacement for MongoDBEnv that replays recorded daily state
+    # trajectories from memory. Time is virtual: every step advances the clock
+    # by step_minutes and the episode ends at the last step of the day instead
+    # of waiting for 23:59 on the wall clock. Rewards follow MongoDBEnv._take_action.
+    def __init__(self, traces, step_minutes=60, seed=None):
+        super(TraceEnv, self).__init__()
+        self.traces = np.asarray(traces, dtype=np.float32)
+        self.step_minutes = step_minutes
+        self.rng = np.random.default_rng(seed)
+        self.action_space = spaces.Discrete(len(ACTION_REWARDS))
+        self.observation_space = spaces.Box(low=0, high=1, shape=self.traces.shape[2:], dtype=np.float32)
+        self.day = 0
+        self.t = 0
+
+    @property
+    def clock(self):
+        return datetime.min + timedelta(days=self.day, minutes=self.t * self.step_minutes)
+
+    def reset(self):
+        self.day = int(self.rng.integers(len(self.traces)))
+        self.t = 0
+        return self.traces[self.day, 0]
+
+    def step(self, action):
+        reward = float(ACTION_REWARDS[action])
+        self.t += 1
+        done = self.t >= self.traces.shape[1] - 1
+        return self.traces[self.day, self.t], reward, done, {}
+
+
+class TraceVecEnv:
+    # Steps K trace replays in lockstep with pure array ops; same interface as
+    # vec_env.VecEnv, so train_agent_vec runs on it unchanged. step_arrays is
+    # the allocation-light path for throughput benchmarks and sweeps.
+    def __init__(self, traces, num_envs, seed=None):
+        self.traces = np.asarray(traces, dtype=np.float32)
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+        self.action_space = spaces.Discrete(len(ACTION_REWARDS))
+        self.observation_space = spaces.Box(low=0, high=1, shape=self.traces.shape[2:], dtype=np.float32)
+        self.last_step = self.traces.shape[1] - 1
+        self.day = np.zeros(num_envs, dtype=np.int64)
+        self.t = np.zeros(num_envs, dtype=np.int64)
+
+    def reset(self):
+        self.day = self.rng.integers(len(self.traces), size=self.num_envs)
+        self.t[:] = 0
+        return self.traces[self.day, 0]
+
+    def step_arrays(self, actions):
+        rewards = ACTION_REWARDS[actions]
+        self.t += 1
+        states = self.traces[self.day, self.t]
+        dones = self.t >= self.last_step
+        terminal = states[dones]
+        if terminal.size:
+            # Auto-reset finished envs onto a fresh random day
+            self.day[dones] = self.rng.integers(len(self.traces), size=len(terminal))
+            self.t[dones] = 0
+            states[dones] = self.traces[self.day[dones], 0]
+        return states, rewards, dones, terminal
+
+    def step(self, actions):
+        states, rewards, dones, terminal = self.step_arrays(np.asarray(actions))
+        infos = [{} for _ in range(self.num_envs)]
+        for info, final_state in zip((infos[i] for i in np.flatnonzero(dones)), terminal):
+            info["terminal_observation"] = final_state
+        return states, rewards, dones, infos
+
+    def close(self):
+        pass
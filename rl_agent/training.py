@@ -1,5 +1,21 @@
-def train_agent(env, agent, episodes=1000, batch_size=32):
-    for e in range(episodes):
+import numpy as np
+
+from .checkpoint import load_checkpoint, save_checkpoint
+
+
+def _resume(agent, checkpoint_dir):
+    # Returns (step, episode) to continue from; (0, 0) for a fresh run
+    restored = load_checkpoint(agent, checkpoint_dir) if checkpoint_dir else None
+    if restored is None:
+        return 0, 0
+    step, extra = restored
+    print(f"Resumed from step {step}, episode {extra.get('episode', 0)}")
+    return step, extra.get("episode", 0)
+
+
+def train_agent(env, agent, episodes=1000, batch_size=32, checkpoint_dir=None, checkpoint_every=10000):
+    step, start_episode = _resume(agent, checkpoint_dir)
+    for e in range(start_episode, episodes):
         state = env.reset()
         total_reward = 0
         done = False
@@ -13,4 +29,46 @@ def train_agent(env, agent, episodes=1000, batch_size=32):
                 print(f"Episode: {e+1}/{episodes}, Total Reward: {total_reward}, Epsilon: {agent.epsilon:.2f}")
                 break
             if len(agent.memory) > batch_size:
-                agent.replay(batch_size)
\ No newline at end of file
+                agent.replay(batch_size)
+            step += 1
+            if checkpoint_dir and step % checkpoint_every == 0:
+                save_checkpoint(agent, checkpoint_dir, step, episode=e)
+
+def train_agent_vec(vec_env, agent, episodes=1000, batch_size=32, replays_per_step=1,
+                    checkpoint_dir=None, checkpoint_every=1000):
+    # Same loop as train_agent, but every step acts on all K envs at once
+    step, finished = _resume(agent, checkpoint_dir)
+    states = vec_env.reset()
+    episode_rewards = [0.0] * vec_env.num_envs
+    while finished < episodes:
+        actions = agent.act_batch(states, explore=True)
+        next_states, rewards, dones, infos = vec_env.step(actions)
+
+        # Finished envs were auto-reset; store their real final state instead
+        stored_next = next_states.copy()
+        for i in np.flatnonzero(dones):
+            stored_next[i] = infos[i]["terminal_observation"]
+        agent.memory.add_batch(states, actions, rewards, stored_next, dones)
+
+        for i in range(vec_env.num_envs):
+            episode_rewards[i] += rewards[i]
+            if dones[i]:
+                finished += 1
+                print(f"Episode: {finished}/{episodes}, Total Reward: {episode_rewards[i]}, Epsilon: {agent.epsilon:.2f}")
+                episode_rewards[i] = 0.0
+
+        states = next_states
+        if len(agent.memory) > batch_size:
+            for _ in range(replays_per_step):
+                agent.replay(batch_size)
+        step += 1
+        if checkpoint_dir and step % checkpoint_every == 0:
+            save_checkpoint(agent, checkpoint_dir, step, episode=finished)
+
+
+def train_offline(agent, dataset, steps=100000, batch_size=256, log_every=1000):
+    # Learn straight from a memory-mapped offline_dataset.TransitionDataset
+    for step in range(1, steps + 1):
+        td_errors = agent.learn(dataset.sample(batch_size))
+        if step % log_every == 0:
+            print(f"Step: {step}/{steps}, TD MSE: {np.mean(td_errors ** 2):.4f}")
@@ -0,0 +1,43 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class VecEnv:
+    # Steps K environments in parallel on a thread pool. MongoDBEnv spends its
+    # step time waiting on Mongo round trips, which release the GIL, so threads
+    # overlap that latency without the pickling cost of worker processes.
+    def __init__(self, env_fns, max_workers=None):
+        self.envs = [fn() for fn in env_fns]
+        self.num_envs = len(self.envs)
+        self.observation_space = self.envs[0].observation_space
+        self.action_space = self.envs[0].action_space
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or self.num_envs)
+
+    def reset(self):
+        states = list(self.executor.map(lambda env: env.reset(), self.envs))
+        return np.stack(states).astype(np.float32)
+
+    def step(self, actions):
+        results = list(self.executor.map(self._step_one, self.envs, actions))
+        states, rewards, dones, infos = zip(*results)
+        return (
+            np.stack(states).astype(np.float32),
+            np.array(rewards, dtype=np.float32),
+            np.array(dones, dtype=bool),
+            list(infos),
+        )
+
+    @staticmethod
+    def _step_one(env, action):
+        state, reward, done, info = env.step(int(action))
+        if done:
+            # Auto-reset so the batch never stalls; keep the real final state
+            info = dict(info, terminal_observation=state)
+            state = env.reset()
+        return state, reward, done, info
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for env in self.envs:
+            env.close()